@@ -40,6 +40,13 @@ def cmd( self, *args, **kwargs ):
         "Run a command in our owning node"
         return self.node.cmd( *args, **kwargs )
 
+    def cmdStatus( self, *args ):
+        """Run a command in our owning node using pexec(), so that we
+           don't read backgrounded output from the cli in its shell
+           returns: output, exit status"""
+        out, _err, exitcode = self.node.pexec( *args )
+        return out, exitcode
+
     def ifconfig( self, *args ):
         "Configure ourselves using ifconfig"
         return self.cmd( 'ifconfig', self.name, *args )
@@ -65,14 +72,12 @@ def setMAC( self, macstr ):
 
     _ipMatchRegex = re.compile( r'\d+\.\d+\.\d+\.\d+' )
     _macMatchRegex = re.compile( r'..:..:..:..:..:..' )
+    _inetMatchRegex = re.compile( r'inet (?:addr:)?(\d+\.\d+\.\d+\.\d+)' )
 
     def updateIP( self ):
         "Return updated IP address based on ifconfig"
-        # use pexec instead of node.cmd so that we dont read
-        # backgrounded output from the cli.
-        ifconfig, _err, _exitCode = self.node.pexec(
-            'ifconfig %s' % self.name )
-        ips = self._ipMatchRegex.findall( ifconfig )
+        ifconfig, exitcode = self.cmdStatus( 'ifconfig %s' % self.name )
+        ips = self._inetMatchRegex.findall( ifconfig ) if not exitcode else []
         self.ip = ips[ 0 ] if ips else None
         return self.ip
 
@@ -121,6 +126,27 @@ def rename( self, newname ):
         """Rename interface"""
         pass
 
+    def setOffloads( self, **offloads ):
+        """Set offload features with ethtool
+           offloads: features as for ethtool -K, e.g. gro=False
+           returns: ethtool output"""
+        args = []
+        for feature, on in sorted( offloads.items() ):
+            args += [ feature, 'on' if on else 'off' ]
+        return self.cmd( 'ethtool -K', self, *args )
+
+    @staticmethod
+    def batchOffloads( offloads ):
+        """Set offload features of many interfaces
+           offloads: { intf: { feature: on } }
+           returns: { intf: error output } for failed interfaces"""
+        errors = {}
+        for intf, features in offloads.items():
+            output = intf.setOffloads( **features )
+            if output:
+                errors[ intf ] = output
+        return errors
+
     # The reason why we configure things in this way is so
     # That the parameters can be listed and documented in
     # the config method.
@@ -147,11 +173,12 @@ def setParam( self, results, method, **param ):
         return result
 
     def config( self, mac=None, ip=None, ifconfig=None,
-                up=True, **_params ):
+                up=True, mtu=None, **_params ):
         """Configure Node according to (optional) parameters:
            mac: MAC address
            ip: IP address
            ifconfig: arbitrary interface configuration
+           mtu: MTU (if our platform supports setMTU())
            Subclasses should override this method and call
            the parent class's config(**params)"""
         # If we were overriding this method, we would call
@@ -162,6 +189,7 @@ def config( self, mac=None, ip=None, ifconfig=None,
         self.setParam( r, 'setIP', ip=ip )
         self.setParam( r, 'isUp', up=up )
         self.setParam( r, 'ifconfig', ifconfig=ifconfig )
+        self.setParam( r, 'setMTU', mtu=mtu )
         return r
 
     def delete( self ):
@@ -6,7 +6,19 @@
 import pty
 import re
 import select
+import socket
+from collections import namedtuple
 from subprocess import Popen, PIPE
+from time import time
+
+try:
+    import asyncio
+except ImportError:
+    # Python 2: fall back to the trollius backport if it is installed
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
 
 plat = os.uname()[ 0 ]
 if plat == 'FreeBSD':
@@ -23,16 +35,108 @@
 from re import findall
 
 
+# Result of cmd( ..., result=True ): output, exit status and
+# elapsed (wall clock) time in seconds
+CmdResult = namedtuple( 'CmdResult', 'output status elapsed' )
+
+
+class OutputParser( object ):
+    """Incremental parser for the output of a node's shell.
+       Removes the ^A{pid}\\n marker printed by mnexec -p and the
+       ^B{status}^? prompt, keeping state across chunks so that each
+       byte of output is only examined once."""
+
+    specialre = re.compile( '[%s%s%s]' % ( chr( 1 ), chr( 2 ), chr( 127 ) ) )
+
+    def __init__( self ):
+        self.token = None  # partial marker or prompt
+        self.pid, self.status, self.done = None, None, False
+
+    def reset( self ):
+        "Reset for a new command, keeping any partial token"
+        self.pid, self.status, self.done = None, None, False
+
+    def feed( self, data, findPid=True ):
+        """Parse a chunk of shell output.
+           data: chunk of output
+           findPid: look for PID from mnexec -p
+           returns: data with any markers and prompts removed"""
+        output, pos, size = [], 0, len( data )
+        while pos < size:
+            if self.token is not None:
+                pos = self.feedToken( data, pos, output )
+                continue
+            match = self.specialre.search( data, pos )
+            if not match:
+                output.append( data[ pos: ] if pos else data )
+                break
+            start = match.start()
+            if start > pos:
+                output.append( data[ pos:start ] )
+            c = data[ start ]
+            if c == chr( 127 ):
+                # Bare sentinel
+                self.done = True
+            elif c == chr( 2 ) or findPid:
+                self.token = c
+            else:
+                output.append( c )
+            pos = start + 1
+        return ''.join( output )
+
+    def feedToken( self, data, pos, output ):
+        """Internal method: continue parsing a marker or prompt
+           returns: new position in data"""
+        token, size = self.token, len( data )
+        # Consume digits (and the \r of a marker's \r\n)
+        end = pos
+        marker = token[ 0 ] == chr( 1 )
+        while end < size and ( data[ end ].isdigit() or
+                               data[ end ] == '\r' and marker ):
+            end += 1
+        token += data[ pos:end ]
+        if end == size:
+            # Incomplete: wait for the next chunk
+            self.token = token
+            return end
+        self.token = None
+        kind, digits = token[ 0 ], token[ 1: ].rstrip( '\r' )
+        c = data[ end ]
+        if kind == chr( 1 ) and c == '\n' and digits:
+            self.pid = int( digits )
+        elif kind == chr( 2 ) and c == chr( 127 ):
+            self.status = int( digits ) if digits else None
+            self.done = True
+        else:
+            # Not a marker after all; pass it through
+            output.append( token )
+            return end
+        return end + 1
+
+
 class BaseNode( object ):
     """A virtual network node is simply a shell in a network namespace.
        We communicate with it using pipes."""
 
     portBase = 0  # Nodes always start with eth0/port0, even in OF 1.0
 
+    # Where TCIntf.config() saves our interfaces' settings while they
+    # are deferred (see TCIntf.deferConfig())
+    tcDeferral = None
+
+    # Shell prompt: ^B{exit status of last command}, followed by the
+    # sentinel character ASCII(127) which signals command completion
+    prompt = chr( 2 ) + '$?' + chr( 127 )
+    promptre = re.compile( chr( 2 ) + r'(\d+)' + chr( 127 ) )
+
     def __init__( self, name, inNamespace=True, **params ):
         """name: name of node
            inNamespace: in network namespace?
            privateDirs: list of private directory strings or tuples
+           waitShell: wait for shell to start? (True); if False,
+             startup completes in waitShell() or the first command
+           usePty: talk to shell over a pty? (True) if False, use
+             a socketpair, which saves a pty and is a bit faster
            params: Node parameters (see config() for details)"""
 
         # Make sure class actually works
@@ -41,6 +145,7 @@ def __init__( self, name, inNamespace=True, **params ):
         self.name = params.get( 'name', name )
         self.privateDirs = params.get( 'privateDirs', [] )
         self.inNamespace = params.get( 'inNamespace', inNamespace )
+        self.usePty = params.get( 'usePty', self.usePty )
 
         # Stash configuration parameters for future reference
         self.params = params
@@ -52,13 +157,16 @@ def __init__( self, name, inNamespace=True, **params ):
 
         # Make pylint happy
         ( self.shell, self.execed, self.pid, self.stdin, self.stdout,
-            self.lastPid, self.lastCmd, self.pollOut ) = (
-                None, None, None, None, None, None, None, None )
+            self.lastPid, self.lastCmd, self.lastStatus, self.pollOut ) = (
+                None, None, None, None, None, None, None, None, None )
         self.waiting = False
-        self.readbuf = ''
+        self.starting = False
+        self.readbuf = bytearray()
+        self.readSize = self.readMin
+        self.parser = OutputParser()
 
         # Start command interpreter shell
-        self.startShell()
+        self.startShell( wait=params.get( 'waitShell', True ) )
         self.mountPrivateDirs()
 
     # File descriptor to node mapping support
@@ -79,18 +187,42 @@ def getShell( self, master, slave, mnopts=None ):
         # OS-specific virtualization method - overriden in system nodes
         pass
 
+    # Talk to our shell over a pty rather than a socketpair?
+    usePty = True
+
+    # Command to initialize a newly started shell
+    # +m: disable job control notification
+    shellInit = 'unset HISTFILE; set +m'
+    # Keep our shell from echoing its input: on a pty, turn off
+    # echo; otherwise, turn off line editing, which echoes too
+    ptyInit = 'stty -echo; '
+    socketInit = 'set +o emacs; '
+
     # Command support via shell process in namespace
-    def startShell( self, mnopts=None ):
-        "Start a shell process for running commands"
+    def startShell( self, mnopts=None, wait=True ):
+        """Start a shell process for running commands
+           mnopts: options for mnexec
+           wait: wait for shell to start? (True) if False, call
+             waitShell() later, e.g. after starting other shells"""
         if self.shell:
             error( "%s: shell is already running\n" % self.name )
             return
 
-        # Spawn a shell subprocess in a pseudo-tty, to disable buffering
-        # in the subprocess and insulate it from signals (e.g. SIGINT)
-        # received by the parent
-        master, slave = pty.openpty()
-        self.shell = self.getShell( master, slave, mnopts )
+        if self.usePty:
+            # Spawn a shell subprocess in a pseudo-tty, to disable
+            # buffering in the subprocess and insulate it from signals
+            # (e.g. SIGINT) received by the parent
+            master, slave = pty.openpty()
+            self.shell = self.getShell( master, slave, mnopts )
+        else:
+            # Spawn a shell subprocess on one end of a socketpair.
+            # We lose echo and the terminal's signal characters, which
+            # we don't want anyway (see sendInt()), and the pty limit
+            ours, theirs = socket.socketpair()
+            master, slave = os.dup( ours.fileno() ), theirs.fileno()
+            ours.close()
+            self.shell = self.getShell( master, slave, mnopts )
+            theirs.close()
         self.stdin = os.fdopen( master, 'rw' )
         self.stdout = self.stdin
         self.pid = self.shell.pid
@@ -104,16 +236,34 @@ def startShell( self, mnopts=None ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
-            self.pollOut.poll()
+        self.lastStatus = None
+        self.readbuf = bytearray()
+        self.parser = OutputParser()
         self.waiting = False
-        # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.starting = True
+        if wait:
+            self.waitShell()
+
+    def readPrompt( self ):
+        """Read output from a starting shell, potentially blocking.
+           returns: True if the shell has printed its first prompt"""
+        self.parser.feed( self.read( 1024 ), findPid=False )
+        if self.parser.done:
+            self.starting = False
+        return not self.starting
+
+    def waitShell( self ):
+        "Wait for a shell started with wait=False, and initialize it"
+        if not self.starting:
+            return
+        while not self.readPrompt():
+            self.pollOut.poll()
+        self.cmd( self.shellInitCmd() )
+
+    def shellInitCmd( self ):
+        "Return command to initialize our newly started shell"
+        return ( self.ptyInit if self.usePty else
+                 self.socketInit ) + self.shellInit
 
     def mountPrivateDirs( self ):
         "mount private directories - overridden"
@@ -123,13 +273,14 @@ def unmountPrivateDirs( self ):
         "mount private directories -  overridden"
         pass
 
-    def _popen( self, cmd, **params ):
+    def _popen( self, cmd, popen=Popen, **params ):
         """Internal method: spawn and return a process
             cmd: command to run (list)
+            popen: process constructor (Popen)
             params: parameters to Popen()"""
         # Leave this is as an instance method for now
         assert self
-        return Popen( cmd, **params )
+        return popen( cmd, **params )
 
     def cleanup( self ):
         "Help python collect its garbage."
@@ -137,30 +288,42 @@ def cleanup( self ):
 
     # Subshell I/O, commands and control
 
+    # Read size limits: reads start at readMin bytes, and double (up to
+    # readMax) while the shell produces output faster than we read it
+    readMin = 1024
+    readMax = 65536
+
     def read( self, maxbytes=1024 ):
         """Buffered read from node, potentially blocking.
            maxbytes: maximum number of bytes to return"""
-        count = len( self.readbuf )
-        if count < maxbytes:
-            data = os.read( self.stdout.fileno(), maxbytes - count )
-            self.readbuf += data
-        if maxbytes >= len( self.readbuf ):
-            result = self.readbuf
-            self.readbuf = ''
-        else:
-            result = self.readbuf[ :maxbytes ]
-            self.readbuf = self.readbuf[ maxbytes: ]
-        return result
+        if self.readbuf:
+            # Return buffered data first, without blocking
+            result = str( self.readbuf[ :maxbytes ] )
+            del self.readbuf[ :maxbytes ]
+            return result
+        return os.read( self.stdout.fileno(), maxbytes )
+
+    def readChunk( self ):
+        """Read a chunk of output from node, potentially blocking,
+           adapting the read size to the rate of output."""
+        data = self.read( self.readSize )
+        if len( data ) >= self.readSize:
+            self.readSize = min( self.readSize * 2, self.readMax )
+        elif len( data ) < self.readSize // 4:
+            self.readSize = max( self.readSize // 2, self.readMin )
+        return data
 
     def readline( self ):
         """Buffered readline from node, potentially blocking.
            returns: line (minus newline) or None"""
-        self.readbuf += self.read( 1024 )
-        if '\n' not in self.readbuf:
-            return None
         pos = self.readbuf.find( '\n' )
-        line = self.readbuf[ 0: pos ]
-        self.readbuf = self.readbuf[ pos + 1: ]
+        if pos < 0:
+            self.readbuf += os.read( self.stdout.fileno(), self.readMin )
+            pos = self.readbuf.find( '\n' )
+            if pos < 0:
+                return None
+        line = str( self.readbuf[ :pos ] )
+        del self.readbuf[ :pos + 1 ]
         return line
 
     # overridden in some platforms
@@ -173,6 +336,11 @@ def terminate( self ):
         "Send kill signal to Node and clean up after it."
         pass
 
+    def sendInt( self, intr=chr( 3 ) ):
+        """Interrupt running command - overridden in system nodes
+           intr: interrupt character for our shell's pty (^C)"""
+        self.write( intr )
+
     def stop( self, deleteIntfs=False ):
         """Stop node.
            deleteIntfs: delete interfaces? (False)"""
@@ -186,12 +354,16 @@ def waitReadable( self, timeoutms=None ):
            returns: result of poll()"""
         if len( self.readbuf ) == 0:
             return self.pollOut.poll( timeoutms )
+        # Buffered data is always readable
+        return [ ( self.stdout.fileno(), select.POLLIN ) ]
 
     def sendCmd( self, *args, **kwargs ):
         """Send a command, followed by a command to echo a sentinel,
            and return without waiting for the command to complete.
            args: command and arguments, or string
            printPid: print command's PID? (False)"""
+        if self.starting:
+            self.waitShell()
         assert self.shell and not self.waiting
         printPid = kwargs.get( 'printPid', True )
         # Allow sendCmd( [ list ] )
@@ -215,6 +387,8 @@ def sendCmd( self, *args, **kwargs ):
             cmd = 'mnexec -p ' + cmd
         self.write( cmd + '\n' )
         self.lastPid = None
+        self.lastStatus = None
+        self.parser.reset()
         self.waiting = True
 
     def monitor( self, timeoutms=None, findPid=True ):
@@ -225,61 +399,243 @@ def monitor( self, timeoutms=None, findPid=True ):
         ready = self.waitReadable( timeoutms )
         if not ready:
             return ''
-        data = self.read( 1024 )
-        pidre = r'\[\d+\] \d+\r\n'
-        # Look for PID
-        marker = chr( 1 ) + r'\d+\r\n'
-        if findPid and chr( 1 ) in data:
-            # suppress the job and PID of a backgrounded command
-            if re.findall( pidre, data ):
-                data = re.sub( pidre, '', data )
-            # Marker can be read in chunks; continue until all of it is read
-            while not re.findall( marker, data ):
-                data += self.read( 1024 )
-            markers = re.findall( marker, data )
-            if markers:
-                self.lastPid = int( markers[ 0 ][ 1: ] )
-                data = re.sub( marker, '', data )
-        # Look for sentinel/EOF
-        if len( data ) > 0 and data[ -1 ] == chr( 127 ):
-            self.waiting = False
-            data = data[ :-1 ]
-        elif chr( 127 ) in data:
+        return self.readOutput( findPid=findPid )
+
+    # Job number and PID that bash prints for a backgrounded command
+    pidre = re.compile( r'\[\d+\] \d+\r?\n' )
+
+    def readOutput( self, findPid=True ):
+        """Read and return available output of a command, removing
+           the PID marker and prompt. Set self.waiting to False and
+           self.lastStatus to the command's exit status if command
+           has completed.
+           findPid: look for PID from mnexec -p"""
+        parser = self.parser
+        foundPid = parser.pid is not None
+        data = parser.feed( self.readChunk(), findPid=findPid )
+        if findPid and not foundPid and self.lastCmd.endswith( '&' ):
+            # suppress the job and PID of a backgrounded command,
+            # which precede our PID marker
+            data = self.pidre.sub( '', data )
+        if parser.pid is not None:
+            self.lastPid = parser.pid
+        if parser.done:
+            self.lastStatus = parser.status
             self.waiting = False
-            data = data.replace( chr( 127 ), '' )
         return data
 
+    # asyncio support: these methods use the event loop's reader
+    # callbacks on our shell's fd rather than blocking in poll(), so
+    # that many nodes may be driven from a single thread. They return
+    # Futures, which Python 2 code (with trollius) can't await, but
+    # can run with loop.run_until_complete() or yield From() in a
+    # trollius coroutine
+
+    @staticmethod
+    def checkAsyncio():
+        "Make sure asyncio (or trollius) is available"
+        if asyncio is None:
+            raise Exception( 'asyncio support requires Python 3 '
+                             'or the trollius package' )
+
+    def amonitor( self, findPid=True, loop=None ):
+        """Monitor the output of a command asynchronously.
+           findPid: look for PID from mnexec -p
+           loop: event loop (default: asyncio.get_event_loop())
+           returns: Future for the next chunk of output"""
+        self.checkAsyncio()
+        loop = loop or asyncio.get_event_loop()
+        future = asyncio.Future( loop=loop )
+        fd = self.stdout.fileno()
+
+        def ready():
+            "Reader callback: read one chunk and resolve future"
+            loop.remove_reader( fd )
+            try:
+                future.set_result( self.readOutput( findPid=findPid ) )
+            except ( IOError, OSError ) as e:
+                future.set_exception( e )
+
+        if self.readbuf:
+            ready()
+        else:
+            loop.add_reader( fd, ready )
+        return future
+
+    def acmd( self, *args, **kwargs ):
+        """Send a command and wait for its output asynchronously.
+           args: command and arguments, or string
+           loop: event loop (default: asyncio.get_event_loop())
+           returns: Future for the output of the command"""
+        self.checkAsyncio()
+        loop = kwargs.pop( 'loop', None ) or asyncio.get_event_loop()
+        verbose = kwargs.get( 'verbose', False )
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, args ) )
+        future = asyncio.Future( loop=loop )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
+            future.set_result( None )
+            return future
+        self.sendCmd( *args, **kwargs )
+        fd = self.stdout.fileno()
+        output = []
+
+        def ready():
+            "Reader callback: accumulate output until sentinel"
+            try:
+                data = self.readOutput()
+            except ( IOError, OSError ) as e:
+                loop.remove_reader( fd )
+                future.set_exception( e )
+                return
+            output.append( data )
+            log( data )
+            if not self.waiting:
+                loop.remove_reader( fd )
+                future.set_result( ''.join( output ) )
+
+        # Output which we have already buffered (e.g. in readline())
+        # won't make our fd readable, so consume it first
+        while self.readbuf and self.waiting:
+            ready()
+        if self.waiting:
+            loop.add_reader( fd, ready )
+        return future
+
+    def apopen( self, *args, **kwargs ):
+        """Start a process in our namespace using asyncio subprocesses.
+           args: popen() args, single list, or string
+           kwargs: popen() keyword args
+           returns: awaitable for an asyncio.subprocess.Process"""
+        self.checkAsyncio()
+
+        def spawn( cmd, shell=False, **params ):
+            "Create subprocess using asyncio"
+            if shell:
+                return asyncio.create_subprocess_shell( cmd, **params )
+            return asyncio.create_subprocess_exec( *cmd, **params )
+
+        return self.popen( *args, popen=spawn, **kwargs )
+
     def waitOutput( self, verbose=False, findPid=True ):
         """Wait for a command to complete.
-           Completion is signaled by a sentinel character, ASCII(127)
-           appearing in the output stream.  Wait for the sentinel and return
-           the output, including trailing newline.
+           Completion is signaled by the prompt, which ends with a
+           sentinel character, ASCII(127), appearing in the output
+           stream.  Wait for the sentinel and return the output,
+           including trailing newline.
            verbose: print output interactively"""
         log = info if verbose else debug
-        output = ''
+        output = []
         while self.waiting:
             data = self.monitor( findPid=findPid )
-            output += data
+            output.append( data )
             log( data )
-        return output
+        return ''.join( output )
 
     def cmd( self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
-           cmd: string"""
+           cmd: string
+           result: return CmdResult( output, status, elapsed )
+             instead of output (False)"""
         verbose = kwargs.get( 'verbose', False )
+        result = kwargs.pop( 'result', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
         if self.shell:
+            start = time()
             self.sendCmd( *args, **kwargs )
-            return self.waitOutput( verbose )
+            output = self.waitOutput( verbose )
+            if result:
+                return CmdResult( output, self.lastStatus, time() - start )
+            return output
         else:
             warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
 
+    def cmdIter( self, *args, **kwargs ):
+        """Send a command and yield its output as it arrives, without
+           accumulating it; useful for commands with very large output.
+           If the caller stops iterating early, the command is
+           interrupted and its remaining output is discarded.
+           cmd: string
+           lines: yield complete lines (minus newline) rather than
+             chunks (False)"""
+        lines = kwargs.pop( 'lines', False )
+        debug( '*** %s : %s\n' % ( self.name, args ) )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmdIter%s)\n' % ( self, args ) )
+            return
+        self.sendCmd( *args, **kwargs )
+        partial = ''
+        try:
+            while self.waiting:
+                data = self.monitor()
+                if not data:
+                    continue
+                if not lines:
+                    yield data
+                    continue
+                data = partial + data
+                end = data.rfind( '\n' )
+                partial = data[ end + 1: ]
+                for line in data[ :end + 1 ].splitlines():
+                    yield line
+            if partial:
+                yield partial
+        finally:
+            if self.waiting:
+                # Abandoned by caller: stop the command and drain
+                # its output so that the shell is ready for more
+                self.sendInt()
+                while self.waiting:
+                    self.monitor()
+
     def cmdPrint( self, *args):
         """Call cmd and printing its output
            cmd: string"""
         return self.cmd( *args, **{ 'verbose': True } )
 
+    def cmdBatch( self, cmds, verbose=False ):
+        """Send a list of commands to our shell all at once, and wait
+           for all of them to complete. This is intended for short
+           configuration commands that don't read from stdin.
+           cmds: list of command strings
+           verbose: print output interactively
+           returns: list of ( output, exitcode ) for each command"""
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, cmds ) )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmdBatch%s)\n' % ( self, cmds ) )
+            return None
+        if self.starting:
+            self.waitShell()
+        assert not self.waiting
+        if not cmds:
+            return []
+        # Replace empty commands with something harmless
+        cmds = [ cmd if re.search( r'\w', cmd ) else 'echo -n'
+                 for cmd in cmds ]
+        self.lastCmd = cmds[ -1 ]
+        self.lastPid = None
+        self.waiting = True
+        self.write( '\n'.join( cmds ) + '\n' )
+        # The shell prints a prompt with the exit status after each
+        # command, so we simply wait for one prompt per command
+        chunks, count = [], 0
+        while count < len( cmds ):
+            self.waitReadable()
+            chunk = self.readChunk()
+            log( chunk )
+            chunks.append( chunk )
+            count += chunk.count( chr( 127 ) )
+        self.waiting = False
+        fields = self.promptre.split( ''.join( chunks ) )
+        # fields: out0, status0, out1, status1, ..., ''
+        results = [ ( fields[ i ], int( fields[ i + 1 ] ) )
+                    for i in range( 0, len( fields ) - 1, 2 ) ]
+        self.lastStatus = results[ -1 ][ 1 ]
+        return results
+
     def popen( self, *args, **kwargs ):
         """Return a Popen() object in our namespace
            args: Popen() args, single list, or string
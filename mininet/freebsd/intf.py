@@ -28,8 +28,8 @@ def delete( self ):
 
     def status( self ):
         "Return intf status as a string"
-        links, _err, _result = self.node.pexec( 'ifconfig -l' )
-        if self.name in links:
+        _output, exitcode = self.cmdStatus( 'ifconfig', self.name )
+        if exitcode == 0:
             return "OK"
         else:
             return "MISSING"
@@ -49,8 +49,8 @@ def getShell( self, master, slave, mnopts=None ):
 
         # bash -i: force interactive
         # -s: pass $* to shell, and make process easy to find in ps outside of
-        # a jail. prompt is set to sentinel chr( 127 )
-        cmd = [ execcmd, opts, 'env', 'PS1=' + chr( 127 ),
+        # a jail. prompt is set to exit status and sentinel chr( 127 )
+        cmd = [ execcmd, opts, 'env', 'PS1=' + self.prompt,
                 'bash', '--norc', '-is', 'mininet:' + self.name ]
 
         return Popen( cmd, stdin=slave, stdout=slave, stderr=slave,
@@ -20,42 +20,84 @@
 
 Intf: basic interface object that can configure itself
 TCIntf: interface with bandwidth limiting and delay via tc
+LinkSchedule: replays traces of TCIntf parameters over time
 
 Link: basic link class for creating veth pairs
 """
+import inspect
+import re
 from os import uname
+from subprocess import PIPE, STDOUT
+from threading import Thread, Event
+from time import time
+
+from mininet.util import makeNumeric
 
 plat = uname()[ 0 ]
 if plat == 'FreeBSD':
     from mininet.freebsd.intf import Intf
-    from mininet.freebsd.util import makeIntfPair
+    from mininet.freebsd.util import makeIntfPair, makeIntfPairs
 elif plat == 'Linux':
     from mininet.linux.intf import Intf
-    from mininet.linux.util import makeIntfPair
+    from mininet.linux.util import makeIntfPair, makeIntfPairs
 else:
     from mininet.openbsd.intf import Intf
-    from mininet.openbsd.util import makeIntfPair
+    from mininet.openbsd.util import makeIntfPair, makeIntfPairs
 
 from mininet.log import info, error, debug
 
+# getargspec() is deprecated (and eventually gone) in Python 3
+getargspec = getattr( inspect, 'getfullargspec', None ) or inspect.getargspec
+
 class TCIntf( Intf ):
     """Interface customized by tc (traffic control) utility
        Allows specification of bandwidth limits (various methods)
        as well as delay, loss and max queue length"""
 
     # The parameters we use seem to work reasonably up to 1 Gb/sec
-    # For higher data rates, we will probably need to change them.
+    # For higher data rates, we compute them (see highRateParams())
     bwParamMax = 1000
+    bwParamMaxHighRate = 100000
+
+    # Kernel timer frequency and maximum GSO packet size, which
+    # bound the burst needed to sustain high rates
+    HZ = 250
+    gsoMaxSize = 65536
+
+    @classmethod
+    def highRateParams( cls, bw, mtu=None ):
+        """Return HTB/TBF sizes for shaping at high rates
+           bw: bandwidth in Mb/s
+           mtu: interface MTU (1500)
+           returns: dict of burst, cburst and quantum (bytes)"""
+        mtu = mtu or 1500
+        rate = int( bw * 1000000 / 8 )  # bytes/s
+        # We must be able to send a tick's worth of data at once,
+        # and at least one full GSO packet plus its headers
+        burst = max( rate // cls.HZ, cls.gsoMaxSize + mtu )
+        # We give quantum explicitly, rather than as rate / r2q, so
+        # that the root qdisc (which tc can't change) stays the same:
+        # a tick's worth of data, covering a GSO packet so that we
+        # dequeue it at once, within HTB's limit of 200000 bytes
+        quantum = max( rate // cls.HZ, cls.gsoMaxSize + mtu )
+        quantum = max( mtu, min( 200000, quantum ) )
+        return dict( burst=burst, cburst=burst, quantum=quantum )
 
     def bwCmds( self, bw=None, speedup=0, use_hfsc=False, use_tbf=False,
-                latency_ms=None, enable_ecn=False, enable_red=False ):
+                latency_ms=None, enable_ecn=False, enable_red=False,
+                high_rate=None, mtu=None ):
         "Return tc commands to set bandwidth"
 
         cmds, parent = [], ' root '
 
-        if bw and ( bw < 0 or bw > self.bwParamMax ):
+        # Use high-rate settings automatically when we need them
+        if high_rate is None:
+            high_rate = bw is not None and bw > self.bwParamMax
+        bwMax = self.bwParamMaxHighRate if high_rate else self.bwParamMax
+
+        if bw and ( bw < 0 or bw > bwMax ):
             error( 'Bandwidth limit', bw, 'is outside supported range 0..%d'
-                   % self.bwParamMax, '- ignoring\n' )
+                   % bwMax, '- ignoring\n' )
         elif bw is not None:
             # BL: this seems a bit brittle...
             if ( speedup > 0 and
@@ -65,16 +107,25 @@ def bwCmds( self, bw=None, speedup=0, use_hfsc=False, use_tbf=False,
             # at the semantics of burst (and cburst) to make sure we
             # are specifying the correct sizes. For now I have used
             # the same settings we had in the mininet-hifi code.
+            # At high rates we compute them from the rate instead.
+            sizes = self.highRateParams( bw, mtu ) if high_rate else None
             if use_hfsc:
                 cmds += [ '%s qdisc add dev %s root handle 5:0 hfsc default 1',
                           '%s class add dev %s parent 5:0 classid 5:1 hfsc sc '
                           + 'rate %fMbit ul rate %fMbit' % ( bw, bw ) ]
             elif use_tbf:
+                burst = sizes[ 'burst' ] if sizes else 15000
                 if latency_ms is None:
-                    latency_ms = 15 * 8 / bw
+                    latency_ms = burst * 8 / ( bw * 1000.0 )
                 cmds += [ '%s qdisc add dev %s root handle 5: tbf ' +
-                          'rate %fMbit burst 15000 latency %fms' %
-                          ( bw, latency_ms ) ]
+                          'rate %fMbit burst %d latency %fms' %
+                          ( bw, burst, latency_ms ) ]
+            elif sizes:
+                cmds += [ '%s qdisc add dev %s root handle 5:0 htb default 1',
+                          '%s class add dev %s parent 5:0 classid 5:1 htb ' +
+                          'rate %fMbit burst %d cburst %d quantum %d' %
+                          ( bw, sizes[ 'burst' ], sizes[ 'cburst' ],
+                            sizes[ 'quantum' ] ) ]
             else:
                 cmds += [ '%s qdisc add dev %s root handle 5:0 htb default 1',
                           '%s class add dev %s parent 5:0 classid 5:1 htb ' +
@@ -124,6 +175,27 @@ def delayCmds( parent, delay=None, jitter=None,
                 parent = ' parent 10:1 '
         return cmds, parent
 
+    def tcCmds( self, bw=None, delay=None, jitter=None, loss=None,
+                speedup=0, use_hfsc=False, use_tbf=False,
+                latency_ms=None, enable_ecn=False, enable_red=False,
+                max_queue_size=None, high_rate=None, mtu=None, **_params ):
+        """Internal method: return tc commands to add our qdiscs and
+           classes, and the parent for any further ones; see config()"""
+        # Bandwidth limits via various methods
+        cmds, parent = self.bwCmds( bw=bw, speedup=speedup,
+                                    use_hfsc=use_hfsc, use_tbf=use_tbf,
+                                    latency_ms=latency_ms,
+                                    enable_ecn=enable_ecn,
+                                    enable_red=enable_red,
+                                    high_rate=high_rate, mtu=mtu )
+
+        # Delay/jitter/loss/max_queue_size using netem
+        delaycmds, parent = self.delayCmds( delay=delay, jitter=jitter,
+                                            loss=loss,
+                                            max_queue_size=max_queue_size,
+                                            parent=parent )
+        return cmds + delaycmds, parent
+
     def tc( self, cmd, tc='tc' ):
         "Execute tc command for our interface"
         c = cmd % (tc, self)  # Add in tc command and our name
@@ -131,10 +203,10 @@ def tc( self, cmd, tc='tc' ):
         return self.cmd( c )
 
     def config( self, bw=None, delay=None, jitter=None, loss=None,
-                gro=False, txo=True, rxo=True,
+                gro=False, txo=True, rxo=True, tso=None,
                 speedup=0, use_hfsc=False, use_tbf=False,
                 latency_ms=None, enable_ecn=False, enable_red=False,
-                max_queue_size=None, **params ):
+                max_queue_size=None, high_rate=None, **params ):
         """Configure the port and set its properties.
            bw: bandwidth in b/s (e.g. '10m')
            delay: transmit delay (e.g. '1ms' )
@@ -143,28 +215,32 @@ def config( self, bw=None, delay=None, jitter=None, loss=None,
            gro: enable GRO (False)
            txo: enable transmit checksum offload (True)
            rxo: enable receive checksum offload (True)
+           tso: enable TCP segmentation offload (unchanged)
            speedup: experimental switch-side bw option
            use_hfsc: use HFSC scheduling
            use_tbf: use TBF scheduling
            latency_ms: TBF latency parameter
            enable_ecn: enable ECN (False)
            enable_red: enable RED (False)
-           max_queue_size: queue limit parameter for netem"""
+           max_queue_size: queue limit parameter for netem
+           high_rate: compute burst, quantum etc. from bw, allowing
+                      up to 100 Gb/s (default: if bw > 1 Gb/s)"""
 
         # Support old names for parameters
         gro = not params.pop( 'disable_gro', not gro )
 
         result = Intf.config( self, **params)
 
-        def on( isOn ):
-            "Helper method: bool -> 'on'/'off'"
-            return 'on' if isOn else 'off'
-
-        # Set offload parameters with ethool
-        self.cmd( 'ethtool -K', self,
-                  'gro', on( gro ),
-                  'tx', on( txo ),
-                  'rx', on( rxo ) )
+        # Set offload parameters (like ethtool -K), or leave them for
+        # batchConfig() if we're deferring
+        offloads = dict( gro=gro, tx=txo, rx=rxo )
+        if tso is not None:
+            offloads[ 'tso' ] = tso
+        deferral = self.node.tcDeferral
+        if deferral is not None:
+            deferral[ 'offloads' ][ self ] = offloads
+        else:
+            self.setOffloads( **offloads )
 
         # Optimization: return if nothing else to configure
         # Question: what happens if we want to reset things?
@@ -172,27 +248,15 @@ def on( isOn ):
              and max_queue_size is None ):
             return
 
-        # Clear existing configuration
-        tcoutput = self.tc( '%s qdisc show dev %s' )
-        if "priomap" not in tcoutput and "noqueue" not in tcoutput:
-            cmds = [ '%s qdisc del dev %s root' ]
-        else:
-            cmds = []
-
-        # Bandwidth limits via various methods
-        bwcmds, parent = self.bwCmds( bw=bw, speedup=speedup,
-                                      use_hfsc=use_hfsc, use_tbf=use_tbf,
-                                      latency_ms=latency_ms,
-                                      enable_ecn=enable_ecn,
-                                      enable_red=enable_red )
-        cmds += bwcmds
-
-        # Delay/jitter/loss/max_queue_size using netem
-        delaycmds, parent = self.delayCmds( delay=delay, jitter=jitter,
-                                            loss=loss,
-                                            max_queue_size=max_queue_size,
-                                            parent=parent )
-        cmds += delaycmds
+        cmds, parent = self.tcCmds( bw=bw, delay=delay, jitter=jitter,
+                                    loss=loss, speedup=speedup,
+                                    use_hfsc=use_hfsc, use_tbf=use_tbf,
+                                    latency_ms=latency_ms,
+                                    enable_ecn=enable_ecn,
+                                    enable_red=enable_red,
+                                    max_queue_size=max_queue_size,
+                                    high_rate=high_rate,
+                                    mtu=params.get( 'mtu' ) )
 
         # Ugly but functional: display configuration info
         stuff = ( ( [ '%.2fMbit' % bw ] if bw is not None else [] ) +
@@ -202,6 +266,17 @@ def on( isOn ):
                   ( [ 'ECN' ] if enable_ecn else [ 'RED' ]
                     if enable_red else [] ) )
         info( '(' + ' '.join( stuff ) + ') ' )
+        result[ 'parent' ] = parent
+
+        # Leave the commands for batchConfig() if we're deferring
+        if deferral is not None:
+            deferral[ 'cmds' ][ self ] = cmds
+            return result
+
+        # Clear existing configuration
+        tcoutput = self.tc( '%s qdisc show dev %s' )
+        if self.needsClear( tcoutput ):
+            cmds = [ '%s qdisc del dev %s root' ] + cmds
 
         # Execute all the commands in our node
         debug("at map stage w/cmds: %s\n" % cmds)
@@ -212,10 +287,249 @@ def on( isOn ):
         debug( "cmds:", cmds, '\n' )
         debug( "outputs:", tcoutputs, '\n' )
         result[ 'tcoutputs'] = tcoutputs
-        result[ 'parent' ] = parent
 
         return result
 
+    _tcObjectRegex = re.compile( r'.*? (htb|hfsc|tbf|red|netem) ' )
+
+    def update( self, **params ):
+        """Change some of our tc parameters at runtime, e.g.
+           update( delay='5ms' ). Rather than rebuilding our whole
+           configuration as config() does, which briefly takes the
+           link down and flushes its queues, we change only the qdiscs
+           and classes whose parameters differ, unless the set of
+           qdiscs and classes itself changes.
+           params: tc parameters, as for config()
+           returns: tc command outputs"""
+        old, new = self.params, dict( self.params, **params )
+        oldCmds, _parent = self.tcCmds( **old )
+        newCmds, _parent = self.tcCmds( **new )
+        self.params = new
+        # Remove all shaping
+        if oldCmds and not newCmds:
+            return [ self.tc( '%s qdisc del dev %s root' ) ]
+        # Rebuild if qdiscs or classes are added, removed or replaced
+        cmds = self.changeCmds( oldCmds, newCmds )
+        if cmds is None:
+            result = self.config( **new )
+            return result.get( 'tcoutputs', [] ) if result else []
+        debug( "update: cmds:", cmds, '\n' )
+        tcoutputs = [ self.tc( cmd ) for cmd in cmds ]
+        for output in tcoutputs:
+            if output != '':
+                error( "*** Error: %s" % output )
+        return tcoutputs
+
+    @classmethod
+    def changeCmds( cls, oldCmds, newCmds ):
+        """Return tc change commands to turn the qdiscs and classes
+           added by oldCmds into those added by newCmds, or None
+           if the qdiscs and classes themselves differ"""
+        match = cls._tcObjectRegex.match
+        if ( not oldCmds or len( oldCmds ) != len( newCmds ) or
+             any( match( o ).group() != match( n ).group()
+                  for o, n in zip( oldCmds, newCmds ) ) ):
+            return None
+        return [ n.replace( ' add ', ' change ', 1 )
+                 for o, n in zip( oldCmds, newCmds ) if o != n ]
+
+    @staticmethod
+    def needsClear( tcoutput ):
+        "Does tc qdisc show output show a root qdisc we must delete?"
+        return "priomap" not in tcoutput and "noqueue" not in tcoutput
+
+    @staticmethod
+    def deferConfig( nodes ):
+        """Have config() save the tc commands and offload settings of
+           nodes' interfaces, rather than applying them, until
+           batchConfig() is called with the deferral we return
+           nodes: nodes (e.g. of one network) to defer config for
+           returns: deferral, which holds the saved settings"""
+        deferral = { 'nodes': list( nodes ), 'cmds': {}, 'offloads': {} }
+        for node in deferral[ 'nodes' ]:
+            node.tcDeferral = deferral
+        return deferral
+
+    _failedRegex = re.compile( r'Command failed -:(\d+)' )
+
+    @classmethod
+    def batchConfig( cls, deferral ):
+        """Stop deferring, and run the tc commands which config() has
+           saved in deferral, with one tc -batch per network namespace,
+           and set the saved offloads all at once
+           deferral: deferral from deferConfig()
+           returns: { intf: error output } for failed interfaces"""
+        for node in deferral[ 'nodes' ]:
+            if node.tcDeferral is deferral:
+                node.tcDeferral = None
+        deferred = deferral[ 'cmds' ]
+        errors = Intf.batchOffloads( deferral[ 'offloads' ] )
+        # Interfaces of nodes which aren't in namespaces share ours
+        namespaces = {}
+        for intf in deferred:
+            key = intf.node.pid if intf.node.inNamespace else None
+            namespaces.setdefault( key, [] ).append( intf )
+        for intfs in namespaces.itervalues():
+            # Any node in the namespace can run our commands
+            node = intfs[ 0 ].node
+            # Find out which interfaces we need to clear
+            qdiscs = {}
+            dev = None
+            for line in node.cmd( 'tc qdisc show' ).splitlines():
+                words = line.split()
+                if 'dev' in words[ :-1 ]:
+                    dev = words[ words.index( 'dev' ) + 1 ]
+                qdiscs[ dev ] = qdiscs.get( dev, '' ) + line + '\n'
+            lines, owners = [], []
+            for intf in intfs:
+                cmds = deferred[ intf ]
+                if cls.needsClear( qdiscs.get( intf.name, '' ) ):
+                    cmds = [ '%s qdisc del dev %s root' ] + cmds
+                for cmd in cmds:
+                    lines.append( ( cmd % ( '', intf ) ).strip() )
+                    owners.append( intf )
+            debug( 'tc -batch in %s: %s\n' % ( node, lines ) )
+            popen = node.popen( [ 'tc', '-force', '-batch', '-' ],
+                                stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+            output, _ = popen.communicate( '\n'.join( lines ) + '\n' )
+            # Each failure's messages are followed by its line number
+            messages = ''
+            for line in output.splitlines( True ):
+                match = cls._failedRegex.match( line )
+                if not match:
+                    messages += line
+                    continue
+                intf = owners[ int( match.group( 1 ) ) - 1 ]
+                errors[ intf ] = errors.get( intf, '' ) + messages
+                error( "*** Error: %s: %s" % ( intf, messages ) )
+                messages = ''
+        return errors
+
+
+class LinkSchedule( object ):
+    """Replay traces of tc parameters, e.g. bandwidth, delay and loss
+       recorded on cellular or satellite links, onto TCIntfs.
+       Each trace is compiled in advance into a timeline of tc change
+       commands, which a single thread feeds at the right times to
+       one tc -batch process per network namespace.
+       Example:
+         schedule = LinkSchedule()
+         schedule.add( intf, [ ( 0, { 'bw': 10 } ),
+                               ( .01, { 'bw': 5, 'delay': '30ms' } ) ] )
+         schedule.start()
+         ...
+         schedule.wait()"""
+
+    def __init__( self ):
+        # Timeline of ( time, intf, params, tc batch lines )
+        self.timeline = []
+        self.steps = []
+        self.popens = {}
+        self.thread = None
+        self.stopped = Event()
+        # How late (in seconds) the latest step ran
+        self.maxLag = 0
+
+    @staticmethod
+    def readTrace( filename ):
+        """Read a trace file, with lines of the form
+           time(seconds) param=value param=value ...
+           e.g. '0.010 bw=5 delay=30ms loss=1'; # starts a comment
+           returns: trace for add()"""
+        trace = []
+        with open( filename ) as f:
+            for line in f:
+                words = line.split( '#' )[ 0 ].split()
+                if not words:
+                    continue
+                params = dict( word.split( '=', 1 ) for word in words[ 1: ] )
+                trace.append( ( float( words[ 0 ] ),
+                                dict( ( k, makeNumeric( v ) )
+                                      for k, v in params.items() ) ) )
+        return trace
+
+    def add( self, intf, trace, start=0 ):
+        """Add a trace for an interface
+           intf: TCIntf, already configured with each kind of shaping
+                 the trace uses (e.g. bw and delay)
+           trace: list of ( time in seconds, { tc parameters } )
+           start: time offset for trace (0)"""
+        params = dict( intf.params )
+        cmds, _parent = intf.tcCmds( **params )
+        timeline = []
+        for when, step in trace:
+            params = dict( params, **step )
+            newCmds, _parent = intf.tcCmds( **params )
+            changes = intf.changeCmds( cmds, newCmds )
+            if changes is None:
+                raise Exception( 'LinkSchedule: trace for %s changes its '
+                                 'qdiscs at %ss - please configure it with '
+                                 'all of the parameters the trace uses'
+                                 % ( intf, when ) )
+            lines = [ ( cmd % ( '', intf ) ).strip() for cmd in changes ]
+            timeline.append( ( start + when, intf, params, lines ) )
+            cmds = newCmds
+        self.timeline += timeline
+        self.timeline.sort( key=lambda event: event[ 0 ] )
+
+    def start( self ):
+        "Start replaying our traces in the background"
+        assert not self.thread
+        # One tc -batch per namespace, and one step per distinct time
+        self.steps = []
+        for when, intf, params, lines in self.timeline:
+            node = intf.node
+            key = node.pid if node.inNamespace else None
+            if key not in self.popens:
+                self.popens[ key ] = node.popen(
+                    [ 'tc', '-force', '-batch', '-' ],
+                    stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+            if not self.steps or self.steps[ -1 ][ 0 ] != when:
+                self.steps.append( ( when, {}, [] ) )
+            _when, batches, updates = self.steps[ -1 ]
+            batches.setdefault( self.popens[ key ].stdin, [] ).extend( lines )
+            updates.append( ( intf, params ) )
+        self.stopped.clear()
+        self.thread = Thread( target=self.run )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run( self ):
+        "Internal method: feed our steps to tc at the right times"
+        t0 = time()
+        for when, batches, updates in self.steps:
+            delay = t0 + when - time()
+            if delay > 0:
+                if self.stopped.wait( delay ):
+                    break
+            elif self.stopped.isSet():
+                break
+            else:
+                self.maxLag = max( self.maxLag, -delay )
+            for stdin, lines in batches.items():
+                if lines:
+                    stdin.write( '\n'.join( lines ) + '\n' )
+                    stdin.flush()
+            # Keep update() in step with the trace
+            for intf, params in updates:
+                intf.params = params
+
+    def wait( self ):
+        "Wait for our traces to finish and clean up"
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        for popen in self.popens.values():
+            output, _ = popen.communicate()
+            if output:
+                error( '*** Error: LinkSchedule: %s' % output )
+        self.popens = {}
+
+    def stop( self ):
+        "Stop replaying our traces"
+        self.stopped.set()
+        self.wait()
+
 
 class Link( object ):
 
@@ -226,7 +540,8 @@ class Link( object ):
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None, addr1=None, addr2=None,
                   intf=Intf, cls1=None, cls2=None, params1=None,
-                  params2=None, fast=True ):
+                  params2=None, fast=True, created=False,
+                  numtxqueues=None, numrxqueues=None ):
         """Create veth link to another node, making two new interfaces.
            node1: first node
            node2: second node
@@ -237,7 +552,11 @@ def __init__( self, node1, node2, port1=None, port2=None,
            intfName1: node1 interface name (optional)
            intfName2: node2  interface name (optional)
            params1: parameters for interface 1
-           params2: parameters for interface 2"""
+           params2: parameters for interface 2
+           created: interfaces already exist in their nodes, e.g.
+             from makeIntfPairs() (False; requires fast)
+           numtxqueues: number of transmit queues per interface (optional)
+           numrxqueues: number of receive queues per interface (optional)"""
         # This is a bit awkward; it seems that having everything in
         # params is more orthogonal, but being able to specify
         # in-line arguments is more convenient! So we support both.
@@ -261,15 +580,27 @@ def __init__( self, node1, node2, port1=None, port2=None,
         if not intfName2:
             intfName2 = self.intfName( node2, params2[ 'port' ] )
 
+        # Multi-queue interfaces (only passed on if requested, so that
+        # makeIntfPair() overrides needn't support them)
+        queues = {}
+        if numtxqueues:
+            queues[ 'numtxqueues' ] = numtxqueues
+        if numrxqueues:
+            queues[ 'numrxqueues' ] = numrxqueues
+
         self.fast = fast
         if fast:
             params1.setdefault( 'moveIntfFn', self._ignore )
             params2.setdefault( 'moveIntfFn', self._ignore )
-            p1, p2 = self.makeIntfPair( intfName1, intfName2, addr1,
-                                        addr2, node1, node2,
-                                        deleteIntfs=False )
+            if created:
+                p1, p2 = intfName1, intfName2
+            else:
+                p1, p2 = self.makeIntfPair( intfName1, intfName2, addr1,
+                                            addr2, node1, node2,
+                                            deleteIntfs=False, **queues )
         else:
-            p1, p2 = self.makeIntfPair( intfName1, intfName2, addr1, addr2 )
+            p1, p2 = self.makeIntfPair( intfName1, intfName2, addr1, addr2,
+                                        **queues )
         # Original names of interfaces, if any, and new name are different
         # This is useful in cases where interface renaming isn't supported.
         params1[ 'orgName' ], params2[ 'orgName' ] = p1, p2
@@ -293,15 +624,17 @@ def _ignore( *args, **kwargs ):
         "Ignore any arguments"
         pass
 
-    def intfName( self, node, n ):
+    @classmethod
+    def intfName( cls, node, n ):
         "Construct a canonical interface name node-ethN for interface n."
-        # Leave this as an instance method for now
-        assert self
+        # Leave this as a class method for now
+        assert cls
         return node.name + '-eth' + repr( n )
 
     @classmethod
     def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
-                      node1=None, node2=None, deleteIntfs=True ):
+                      node1=None, node2=None, deleteIntfs=True,
+                      **queues ):
         """Create pair of interfaces
            intfname1: name for interface 1
            intfname2: name for interface 2
@@ -309,12 +642,35 @@ def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
            addr2: MAC address for interface 2 (optional)
            node1: home node for interface 1 (optional)
            node2: home node for interface 2 (optional)
+           queues: numtxqueues and numrxqueues (optional)
            (override this method [and possibly delete()]
            to change link type)"""
         # Leave this as a class method for now
         assert cls
         return makeIntfPair( intfname1, intfname2, addr1, addr2, node1, node2,
-                             deleteIntfs=deleteIntfs )
+                             deleteIntfs=deleteIntfs, **queues )
+
+    @classmethod
+    def makeIntfPairs( cls, pairs ):
+        """Create many pairs of interfaces at once, if supported
+           pairs: list of ( intfname1, intfname2, addr1, addr2,
+             node1, node2 ) as for makeIntfPair()
+           returns: True if pairs were created, False if unsupported"""
+        # Leave this as a class method for now
+        assert cls
+        if not makeIntfPairs:
+            return False
+        makeIntfPairs( pairs )
+        return True
+
+    @classmethod
+    def canBatch( cls ):
+        """Can we create this link class's interfaces with makeIntfPairs()?
+           Its constructor must take created, rather than passing
+           it on to its interfaces as e.g. a TCLink option"""
+        return ( cls.makeIntfPair.__func__ is Link.makeIntfPair.__func__ and
+                 cls.intfName.__func__ is Link.intfName.__func__ and
+                 'created' in getargspec( cls.__init__ ).args )
 
     def delete( self ):
         "Delete this link"
@@ -327,6 +683,18 @@ def stop( self ):
         "Override to stop and clean up link as needed"
         self.delete()
 
+    def diesWithNamespace( self ):
+        """Will our interfaces go away with a node's network namespace,
+           so that stop() may be skipped when the network is stopping?
+           Both ends of a veth pair are deleted when either one's
+           namespace is destroyed."""
+        return ( self.stop.__func__ is Link.stop.__func__ and
+                 self.delete.__func__ is Link.delete.__func__ and
+                 all( intf.delete.__func__ is Intf.delete.__func__
+                      for intf in ( self.intf1, self.intf2 ) ) and
+                 any( intf.node.inNamespace
+                      for intf in ( self.intf1, self.intf2 ) ) )
+
     def status( self ):
         "Return link status as a string"
         return "(%s %s)" % ( self.intf1.status(), self.intf2.status() )
@@ -374,14 +742,18 @@ class TCLink( Link ):
     "Link with symmetric TC interfaces configured via opts"
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None,
-                  addr1=None, addr2=None, **params ):
+                  addr1=None, addr2=None, created=False,
+                  numtxqueues=None, numrxqueues=None, **params ):
         Link.__init__( self, node1, node2, port1=port1, port2=port2,
                        intfName1=intfName1, intfName2=intfName2,
                        cls1=TCIntf,
                        cls2=TCIntf,
                        addr1=addr1, addr2=addr2,
                        params1=params,
-                       params2=params )
+                       params2=params,
+                       created=created,
+                       numtxqueues=numtxqueues,
+                       numrxqueues=numrxqueues )
 
 
 class TCULink( TCLink ):
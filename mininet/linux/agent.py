@@ -0,0 +1,268 @@
+"""
+Exec agent: a small server which stays in a node's namespaces and
+spawns processes there on request, so that popen() need not run
+mnexec (and call setns()) for every command.
+
+The agent reads JSON requests, one per line, on its stdin and writes
+JSON replies and exit notifications on its stdout. Children get their
+stdio by opening the requesting process's descriptors via
+/proc/<pid>/fd, since Python 2 cannot pass descriptors over a socket.
+
+ExecAgent: parent side of the agent.
+
+AgentPopen: a Popen() whose child is spawned and reaped by an agent.
+"""
+
+import errno
+import fcntl
+import json
+import os
+import select
+import signal
+import sys
+from subprocess import Popen, PIPE
+
+
+def retryIntr( fn, *args ):
+    "Call fn( *args ), retrying if interrupted by a signal"
+    while True:
+        try:
+            return fn( *args )
+        except ( OSError, IOError, select.error ) as e:
+            if e.args[ 0 ] != errno.EINTR:
+                raise
+
+
+class ExecAgent( object ):
+    "Parent side of an agent which spawns processes in a node's namespaces"
+
+    def __init__( self, node ):
+        "node: node whose namespaces we attach to"
+        script = os.path.splitext( __file__ )[ 0 ] + '.py'
+        cmd = [ 'mnexec', '-da', str( node.pid ), sys.executable, script,
+                str( os.getpid() ) ]
+        self.proc = Popen( cmd, stdin=PIPE, stdout=PIPE, close_fds=True )
+        self.fd = self.proc.stdout.fileno()
+        self.buf = ''
+        self.lastId = 0
+        self.statuses = {}  # exit status for each reaped pid
+
+    def send( self, msg ):
+        "Send a request to the agent"
+        self.proc.stdin.write( json.dumps( msg ) + '\n' )
+        self.proc.stdin.flush()
+
+    def receive( self, block=True ):
+        """Receive a message from the agent, recording exit statuses.
+           block: wait for a message? (True)
+           returns: message, or None if none is available"""
+        while '\n' not in self.buf:
+            if not block and not select.select( [ self.fd ], [], [], 0 )[ 0 ]:
+                return None
+            data = retryIntr( os.read, self.fd, 4096 )
+            if not data:
+                raise Exception( 'exec agent %d exited' % self.proc.pid )
+            self.buf += data
+        line, self.buf = self.buf.split( '\n', 1 )
+        msg = json.loads( line )
+        if 'exited' in msg:
+            self.statuses[ msg[ 'exited' ] ] = msg[ 'status' ]
+        return msg
+
+    def spawn( self, args, fds, cwd=None, env=None ):
+        """Spawn a process in our namespaces.
+           args: argument list
+           fds: paths for stdin, stdout and stderr, or None to inherit
+           cwd: working directory (optional)
+           env: environment (optional)
+           returns: pid of new process"""
+        self.lastId += 1
+        self.send( { 'id': self.lastId, 'args': args, 'fds': fds,
+                     'cwd': cwd, 'env': env } )
+        while True:
+            msg = self.receive()
+            if msg.get( 'id' ) == self.lastId:
+                return msg[ 'pid' ]
+
+    def status( self, pid, block=True ):
+        """Return exit status of a spawned process.
+           pid: process id
+           block: wait for process to exit? (True)
+           returns: status as from waitpid(), or None if still running"""
+        while pid not in self.statuses:
+            if self.receive( block ) is None:
+                return None
+        return self.statuses.pop( pid )
+
+    def stop( self ):
+        "Stop agent; processes it has spawned keep running"
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+class AgentPopen( Popen ):
+    """Popen() whose child is spawned by an ExecAgent rather than
+       forked by us. preexec_fn is not supported."""
+
+    def __init__( self, agent, args, **params ):
+        "agent: ExecAgent to spawn child"
+        self.agent = agent
+        Popen.__init__( self, args, **params )
+
+    # pylint: disable=arguments-differ,unused-argument
+    def _execute_child( self, args, executable, preexec_fn, close_fds,
+                        cwd, env, universal_newlines,
+                        startupinfo, creationflags, shell, to_close,
+                        p2cread, p2cwrite, c2pread, c2pwrite,
+                        errread, errwrite ):
+        "Have our agent spawn the child"
+        assert preexec_fn is None
+        args = [ args ] if isinstance( args, basestring ) else list( args )
+        if shell:
+            args = [ '/bin/sh', '-c' ] + args
+        if executable:
+            args[ 0 ] = executable
+        pid = os.getpid()
+        fds = [ None if fd is None else '/proc/%d/fd/%d' % ( pid, fd )
+                for fd in ( p2cread, c2pwrite, errwrite ) ]
+        try:
+            self.pid = self.agent.spawn( args, fds, cwd=cwd or os.getcwd(),
+                                         env=env )
+        finally:
+            # The child has opened its ends of our pipes
+            for fd in set( ( p2cread, c2pwrite, errwrite ) ) & to_close:
+                os.close( fd )
+                to_close.remove( fd )
+    # pylint: enable=arguments-differ,unused-argument
+
+    @staticmethod
+    def returnCode( status ):
+        """Convert an exit status from waitpid() to a returncode
+           status: exit status
+           returns: exit code, or -signal if killed by a signal"""
+        if os.WIFSIGNALED( status ):
+            return -os.WTERMSIG( status )
+        return os.WEXITSTATUS( status )
+
+    def poll( self ):
+        "Check if child process has terminated; return returncode"
+        if self.returncode is None:
+            try:
+                status = self.agent.status( self.pid, block=False )
+            except Exception:  # pylint: disable=broad-except
+                # Agent has gone away
+                status = None
+            if status is not None:
+                self.returncode = self.returnCode( status )
+        return self.returncode
+
+    def wait( self ):
+        "Wait for child process to terminate; return returncode"
+        if self.returncode is None:
+            self.returncode = self.returnCode( self.agent.status( self.pid ) )
+        return self.returncode
+
+
+# Agent side
+
+def reply( msg ):
+    "Send a message to our parent"
+    retryIntr( os.write, 1, json.dumps( msg ) + '\n' )
+
+def openStdio( paths, ppid ):
+    """Open our stdin, stdout and stderr
+       paths: paths for each, or None to inherit
+       ppid: pid of process whose inherited descriptors we open"""
+    for i, path in enumerate( paths ):
+        mode = os.O_RDONLY if i == 0 else os.O_WRONLY
+        if path is not None:
+            fd = os.open( path, mode )
+        else:
+            # Inherit our parent's descriptor if we can open it
+            # (we can't if it is e.g. a socket)
+            try:
+                fd = os.open( '/proc/%d/fd/%d' % ( ppid, i ), mode )
+            except OSError:
+                fd = os.open( os.devnull, mode )
+        os.dup2( fd, i )
+
+def spawn( req, ppid ):
+    """Spawn a process as requested
+       req: request message
+       ppid: pid of process whose inherited descriptors we open"""
+    # Our child closes rfd on exec (or exit), once it no longer
+    # needs our parent's descriptors
+    rfd, wfd = os.pipe()
+    fcntl.fcntl( wfd, fcntl.F_SETFD, fcntl.FD_CLOEXEC )
+    pid = os.fork()
+    if pid:
+        os.close( wfd )
+        while retryIntr( os.read, rfd, 1 ):
+            pass
+        os.close( rfd )
+        reply( { 'id': req[ 'id' ], 'pid': pid } )
+        return
+    # Child: set up and exec, as mnexec -d would
+    args, env = req[ 'args' ], req[ 'env' ]
+    try:
+        os.setsid()
+        openStdio( req[ 'fds' ], ppid )
+        # Close other descriptors (listing them is quicker than
+        # closing all possible ones when the fd limit is high)
+        for fd in [ int( name ) for name in os.listdir( '/proc/self/fd' ) ]:
+            if fd > 2 and fd != wfd:
+                try:
+                    os.close( fd )
+                except OSError:
+                    pass
+        os.chdir( req[ 'cwd' ] )
+        signal.set_wakeup_fd( -1 )
+        signal.signal( signal.SIGCHLD, signal.SIG_DFL )
+        if env is None:
+            os.execvp( args[ 0 ], args )
+        os.execvpe( args[ 0 ], args, env )
+    except OSError as e:
+        os.write( 2, '%s: %s\n' % ( args[ 0 ], e.strerror ) )
+    finally:
+        os._exit( 1 )  # pylint: disable=protected-access
+
+def reap():
+    "Report exit status of any children which have exited"
+    while True:
+        try:
+            pid, status = os.waitpid( -1, os.WNOHANG )
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            break
+        if not pid:
+            break
+        reply( { 'exited': pid, 'status': status } )
+
+def serve( ppid ):
+    """Serve requests on stdin until it is closed
+       ppid: pid of requesting process"""
+    # Wake up our select() loop on SIGCHLD
+    rfd, wfd = os.pipe()
+    fcntl.fcntl( wfd, fcntl.F_SETFL, os.O_NONBLOCK )
+    signal.set_wakeup_fd( wfd )
+    signal.signal( signal.SIGCHLD, lambda _signum, _frame: None )
+    buf = ''
+    while True:
+        readable = retryIntr( select.select, [ 0, rfd ], [], [] )[ 0 ]
+        if rfd in readable:
+            os.read( rfd, 4096 )
+            reap()
+        if 0 in readable:
+            data = retryIntr( os.read, 0, 65536 )
+            if not data:
+                break
+            buf += data
+            while '\n' in buf:
+                line, buf = buf.split( '\n', 1 )
+                spawn( json.loads( line ), ppid )
+            # Catch children which exited while we were busy
+            reap()
+
+if __name__ == '__main__':
+    serve( int( sys.argv[ 1 ] ) )
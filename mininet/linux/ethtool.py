@@ -0,0 +1,65 @@
+"""
+Minimal ethtool(8) replacement, which sets interfaces' offload features
+with the SIOCETHTOOL ioctl from our own process, so that configuring
+many interfaces doesn't fork ethtool for each one. Failures raise
+IOError with the kernel's errno.
+
+setOffload(): set one offload feature of an interface
+
+setOffloads(): set offload features of many interfaces in a namespace
+"""
+
+import ctypes
+import fcntl
+import socket
+import struct
+
+from mininet.linux.netlink import inNamespace
+
+# From linux/sockios.h and linux/ethtool.h
+SIOCETHTOOL = 0x8946
+IFNAMSIZ = 16
+IFREQSIZE = 40  # sizeof( struct ifreq ) on 64-bit systems
+
+# ethtool_value set commands, by ethtool -K feature name
+OFFLOADS = { 'rx': 0x15, 'tx': 0x17, 'sg': 0x19, 'tso': 0x1f,
+             'gso': 0x24, 'gro': 0x2c }
+
+ETHTOOL_VALUE = struct.Struct( '=II' )  # cmd, data
+
+
+def setOffload( sock, name, feature, on ):
+    """Set one offload feature of an interface
+       sock: socket in the interface's namespace
+       name: interface name
+       feature: feature name, as for ethtool -K (e.g. 'gro')
+       on: enable feature?"""
+    value = ctypes.create_string_buffer(
+        ETHTOOL_VALUE.pack( OFFLOADS[ feature ], 1 if on else 0 ) )
+    ifreq = struct.pack( '%dsP' % IFNAMSIZ, name,
+                         ctypes.addressof( value ) )
+    fcntl.ioctl( sock.fileno(), SIOCETHTOOL,
+                 ifreq + '\0' * ( IFREQSIZE - len( ifreq ) ) )
+
+def setOffloads( offloads, pid=None ):
+    """Set offload features of many interfaces in one namespace,
+       using a single socket
+       offloads: { intf name: { feature: on } }, with features as
+         for ethtool -K (rx, tx, sg, tso, gso, gro)
+       pid: pid of a process in the namespace, or None for ours
+       returns: { intf name: error } for interfaces which failed"""
+    sock = inNamespace( pid, socket.socket, socket.AF_INET,
+                        socket.SOCK_DGRAM )
+    errors = {}
+    try:
+        for name, features in offloads.iteritems():
+            for feature, on in sorted( features.iteritems() ):
+                try:
+                    setOffload( sock, name, feature, on )
+                except IOError as e:
+                    errors[ name ] = '%s %s: %s' % ( feature,
+                                                     'on' if on else 'off',
+                                                     e.strerror )
+    finally:
+        sock.close()
+    return errors
@@ -1,21 +1,102 @@
 """
-A interface object that relies on ifconfig(8) and ip(8) to manipulate
-network interfaces and devices.
+A interface object that relies on ifconfig(8) and ip(8), or on
+rtnetlink if its node has useNetlink set, to manipulate network
+interfaces and devices.
 """
 from mininet.baseintf import BaseIntf
+from mininet.log import error
+from mininet.linux.util import nodeNetlink, coreList, cpuMask
+from mininet.linux.netlink import ignoreMissing
+from mininet.linux.ethtool import setOffloads
 
 class Intf( BaseIntf ):
-    """Interface objects that use 'ip' and 'ifconfig' to configure the
-    underlying interface that it represents"""
+    """Interface objects that use 'ip' and 'ifconfig' (or rtnetlink)
+    to configure the underlying interface that it represents"""
+
+    def netlink( self ):
+        "Return our node's rtnetlink socket, or None if it doesn't use one"
+        return nodeNetlink( self.node )
+
+    def state( self ):
+        """Return our cached state (see Node.intfState()),
+           or None if we are missing"""
+        return self.node.intfState().get( self.name )
+
+    def updateIP( self ):
+        "Return updated IP address based on our node's interface state"
+        state = self.state()
+        self.ip = state[ 'ip' ] if state else None
+        return self.ip
+
+    def updateMAC( self ):
+        "Return updated MAC address based on our node's interface state"
+        state = self.state()
+        self.mac = state[ 'mac' ] if state else None
+        return self.mac
+
+    def updateAddr( self ):
+        "Return IP address and MAC address based on our node's state"
+        return self.updateIP(), self.updateMAC()
+
+    def setIP( self, ipstr, prefixLen=None ):
+        """Set our IP address"""
+        self.node.clearIntfState()
+        nl = self.netlink()
+        if not nl:
+            return BaseIntf.setIP( self, ipstr, prefixLen )
+        if '/' in ipstr:
+            ipstr, prefixLen = ipstr.split( '/' )
+        elif prefixLen is None:
+            raise Exception( 'No prefix length set for IP address %s'
+                             % ( ipstr, ) )
+        self.ip, self.prefixLen = ipstr, prefixLen
+        nl.setIP( self.name, ipstr, prefixLen )
+        return ''
 
     def setMAC( self, macstr ):
         self.mac = macstr
+        self.node.clearIntfState()
+        nl = self.netlink()
+        if nl:
+            nl.setMAC( self.name, macstr )
+            return ''
         return ( self.ifconfig( 'down' ) +
                  self.ifconfig( 'hw', 'ether', macstr ) +
                  self.ifconfig( 'up' ) )
 
+    def setMTU( self, mtu ):
+        "Set our MTU"
+        self.node.clearIntfState()
+        nl = self.netlink()
+        if nl:
+            nl.setMTU( self.name, mtu )
+            return ''
+        return self.ifconfig( 'mtu', mtu )
+
+    def isUp( self, setUp=False ):
+        "Return whether interface is up"
+        if not setUp:
+            state = self.state()
+            return bool( state and state[ 'up' ] )
+        self.node.clearIntfState()
+        nl = self.netlink()
+        if not nl:
+            return BaseIntf.isUp( self, setUp )
+        try:
+            nl.setUp( self.name )
+            return True
+        except OSError as e:
+            error( "Error setting %s up: %s\n" % ( self.name, e ) )
+            return False
+
     def rename( self, newname ):
         "Rename interface"
+        self.node.clearIntfState()
+        nl = self.netlink()
+        if nl:
+            nl.rename( self.name, newname )
+            self.name = newname
+            return
         self.ifconfig( 'down' )
         result = self.cmd( 'ip link set', self.name, 'name', newname )
         self.name = newname
@@ -23,7 +104,12 @@ def rename( self, newname ):
 
     def delete( self ):
         "Delete interface"
-        self.cmd( 'ip link del ' + self.name )
+        nl = self.netlink()
+        if nl:
+            # Our peer may already have taken us with it
+            ignoreMissing( nl.delLink, self.name )
+        else:
+            self.cmd( 'ip link del ' + self.name )
         # We used to do this, but it slows us down:
         # if self.node.inNamespace:
         # Link may have been dumped into root NS
@@ -33,8 +119,79 @@ def delete( self ):
 
     def status( self ):
         "Return intf status as a string"
-        links, _err, _result = self.node.pexec( 'ip link show' )
-        if self.name in links:
-            return "OK"
-        else:
-            return "MISSING"
+        return "OK" if self.state() else "MISSING"
+
+    def ioctlOffloads( self ):
+        """Can we set our offloads with the SIOCETHTOOL ioctl? Only if
+           our node uses rtnetlink and runs on this machine"""
+        node = self.node
+        return ( getattr( node, 'useNetlink', False ) and
+                 not getattr( node, 'isRemote', False ) )
+
+    def setOffloads( self, **offloads ):
+        """Set offload features with ethtool, or with the SIOCETHTOOL
+           ioctl rather than forking ethtool if our node uses rtnetlink
+           offloads: features as for ethtool -K, e.g. gro=False
+           returns: ethtool output or error message, if any"""
+        if not self.ioctlOffloads():
+            return BaseIntf.setOffloads( self, **offloads )
+        return self.batchOffloads( { self: offloads } ).get( self, '' )
+
+    @staticmethod
+    def batchOffloads( offloads ):
+        """Set offload features of many interfaces, with one socket
+           per network namespace for those which can use the ioctl
+           offloads: { intf: { feature: on } }
+           returns: { intf: error message } for failed interfaces"""
+        namespaces, others = {}, {}
+        for intf in offloads:
+            if not intf.ioctlOffloads():
+                others[ intf ] = offloads[ intf ]
+                continue
+            node = intf.node
+            key = node.pid if node.inNamespace else None
+            namespaces.setdefault( key, [] ).append( intf )
+        errors = BaseIntf.batchOffloads( others )
+        for pid, intfs in namespaces.iteritems():
+            byName = dict( ( intf.name, intf ) for intf in intfs )
+            failed = setOffloads( dict( ( intf.name, offloads[ intf ] )
+                                        for intf in intfs ), pid )
+            for name, message in failed.iteritems():
+                error( "*** Error: %s: %s\n" % ( name, message ) )
+                errors[ byName[ name ] ] = message
+        return errors
+
+    def setCPUs( self, cores ):
+        """Steer our packet processing to (real) cores via RPS and XPS:
+           each receive queue may use any of the cores, and the cores
+           are shared out among our transmit queues
+           cores: core number(s), as for CPULimitedHost.setCPUs()"""
+        cores = coreList( cores )
+        if not cores or self.name == 'lo':
+            return
+        path = '/sys/class/net/%s/queues' % self.name
+        queues = self.cmd( 'ls', path ).split()
+        rxqs = [ q for q in queues if q.startswith( 'rx-' ) ]
+        txqs = sorted( ( q for q in queues if q.startswith( 'tx-' ) ),
+                       key=lambda q: int( q[ 3: ] ) )
+        cmds = [ 'echo %s > %s/%s/rps_cpus' % ( cpuMask( cores ), path, q )
+                 for q in rxqs ]
+        count = max( len( cores ), len( txqs ) )
+        for i, q in enumerate( txqs ):
+            mine = [ cores[ j % len( cores ) ]
+                     for j in range( i, count, len( txqs ) ) ]
+            cmds.append( 'echo %s > %s/%s/xps_cpus' %
+                         ( cpuMask( mine ), path, q ) )
+        return self.cmd( '; '.join( cmds ) )
+
+    def config( self, mac=None, ip=None, ifconfig=None,
+                up=True, mtu=None, **params ):
+        """Configure Node according to (optional) parameters:
+           see BaseIntf.config() for parameters
+           If our node is pinned to cores (see CPULimitedHost), we
+           also steer our queues to them"""
+        r = BaseIntf.config( self, mac=mac, ip=ip, ifconfig=ifconfig,
+                             up=up, mtu=mtu, **params )
+        self.setParam( r, 'setCPUs', cores=getattr( self.node, 'cores',
+                                                    None ) )
+        return r
@@ -0,0 +1,332 @@
+"""
+Minimal rtnetlink client, so that interfaces can be created, moved,
+configured and deleted without forking ip(8) or ifconfig(8) for each
+operation. Failures raise OSError with the kernel's errno.
+
+RtNetlink: rtnetlink socket in a given network namespace
+
+rootNetlink(): shared rtnetlink socket in our own namespace
+
+inNamespace(): call a function (e.g. to create a socket) in a namespace
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+
+# From linux/netlink.h and linux/rtnetlink.h
+NETLINK_ROUTE = 0
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_ACK = 0x1, 0x4
+NLM_F_EXCL, NLM_F_CREATE, NLM_F_DUMP = 0x200, 0x400, 0x300
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+
+# From linux/if_link.h, linux/veth.h and linux/if_addr.h
+IFLA_ADDRESS, IFLA_IFNAME, IFLA_MTU = 1, 3, 4
+IFLA_LINKINFO, IFLA_NET_NS_PID = 18, 19
+IFLA_NUM_TX_QUEUES, IFLA_NUM_RX_QUEUES = 31, 32
+IFLA_INFO_KIND, IFLA_INFO_DATA = 1, 2
+VETH_INFO_PEER = 1
+IFA_ADDRESS, IFA_LOCAL, IFA_BROADCAST = 1, 2, 4
+IFF_UP = 0x1
+ARPHRD_ETHER = 1
+
+CLONE_NEWNET = 0x40000000
+
+NLMSGHDR = struct.Struct( '=IHHII' )  # len, type, flags, seq, pid
+IFINFOMSG = struct.Struct( '=BxHiII' )  # family, type, index, flags, change
+IFADDRMSG = struct.Struct( '=BBBBI' )  # family, prefixlen, flags, scope, index
+RTATTR = struct.Struct( '=HH' )  # len, type
+
+
+def align( length ):
+    "Round length up to netlink's 4-byte alignment"
+    return ( length + 3 ) & ~3
+
+def attr( kind, data ):
+    """Encode an attribute
+       kind: attribute type
+       data: string, or list of encoded attributes to nest"""
+    if isinstance( data, list ):
+        data = ''.join( data )
+    length = RTATTR.size + len( data )
+    return RTATTR.pack( length, kind ) + data + '\0' * ( align( length ) -
+                                                         length )
+
+def attrs( data ):
+    "Decode attributes from data into a dict of type: data"
+    result = {}
+    offset = 0
+    while offset + RTATTR.size <= len( data ):
+        length, kind = RTATTR.unpack_from( data, offset )
+        if length < RTATTR.size:
+            break
+        result[ kind ] = data[ offset + RTATTR.size: offset + length ]
+        offset += align( length )
+    return result
+
+def macToBytes( mac ):
+    "Convert MAC address string to bytes"
+    return ''.join( chr( int( byte, 16 ) ) for byte in mac.split( ':' ) )
+
+def bytesToMac( data ):
+    "Convert bytes to MAC address string"
+    return ':'.join( '%02x' % ord( byte ) for byte in data )
+
+def linkAttrs( name=None, mac=None, mtu=None, pid=None, txqueues=None,
+               rxqueues=None ):
+    "Encode common link attributes"
+    result = []
+    if name is not None:
+        result.append( attr( IFLA_IFNAME, name + '\0' ) )
+    if mac is not None:
+        result.append( attr( IFLA_ADDRESS, macToBytes( mac ) ) )
+    if mtu is not None:
+        result.append( attr( IFLA_MTU, struct.pack( '=I', int( mtu ) ) ) )
+    if pid is not None:
+        result.append( attr( IFLA_NET_NS_PID, struct.pack( '=I', pid ) ) )
+    if txqueues:
+        result.append( attr( IFLA_NUM_TX_QUEUES,
+                             struct.pack( '=I', txqueues ) ) )
+    if rxqueues:
+        result.append( attr( IFLA_NUM_RX_QUEUES,
+                             struct.pack( '=I', rxqueues ) ) )
+    return result
+
+
+_libc = None
+
+def setns( fd ):
+    "Move the calling thread into the network namespace open as fd"
+    global _libc  # pylint: disable=global-statement
+    if _libc is None:
+        _libc = ctypes.CDLL( None, use_errno=True )
+    if _libc.setns( fd, CLONE_NEWNET ) != 0:
+        err = ctypes.get_errno()
+        raise OSError( err, os.strerror( err ) )
+
+def inNamespace( pid, fn, *args ):
+    """Call fn( *args ) in the network namespace of process pid,
+       e.g. to create a socket there, then switch back to ours
+       pid: pid of a process in the namespace, or None for ours
+       returns: fn( *args )"""
+    if pid is None:
+        return fn( *args )
+    ours = os.open( '/proc/thread-self/ns/net'
+                    if os.path.exists( '/proc/thread-self' )
+                    else '/proc/self/ns/net', os.O_RDONLY )
+    try:
+        theirs = os.open( '/proc/%d/ns/net' % pid, os.O_RDONLY )
+        try:
+            setns( theirs )
+            try:
+                return fn( *args )
+            finally:
+                setns( ours )
+        finally:
+            os.close( theirs )
+    finally:
+        os.close( ours )
+
+
+class RtNetlink( object ):
+    """rtnetlink socket in a given network namespace. Requests are
+       synchronous: each waits for the kernel's acknowledgement."""
+
+    def __init__( self, pid=None ):
+        """pid: pid of a process in the namespace to use, or None for
+             our own namespace"""
+        self.seq = 0
+        # A socket stays in the namespace it was created in
+        self.sock = inNamespace( pid, self.socket )
+
+    @staticmethod
+    def socket():
+        "Return a new rtnetlink socket"
+        sock = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                              NETLINK_ROUTE )
+        sock.bind( ( 0, 0 ) )
+        return sock
+
+    def close( self ):
+        "Close our socket (which otherwise keeps its namespace alive)"
+        self.sock.close()
+
+    def request( self, kind, flags, body, name=None ):
+        """Send a request and wait for its acknowledgement.
+           kind: message type
+           flags: additional message flags
+           body: message body
+           name: interface name for error messages (optional)
+           returns: list of ( type, data ) replies, e.g. for a dump"""
+        self.seq += 1
+        flags |= NLM_F_REQUEST | NLM_F_ACK
+        msg = NLMSGHDR.pack( NLMSGHDR.size + len( body ), kind, flags,
+                             self.seq, 0 ) + body
+        self.sock.send( msg )
+        replies = []
+        while True:
+            data = self.sock.recv( 65536 )
+            offset = 0
+            while offset + NLMSGHDR.size <= len( data ):
+                length, kind, _flags, seq, _pid = NLMSGHDR.unpack_from(
+                    data, offset )
+                payload = data[ offset + NLMSGHDR.size: offset + length ]
+                offset += align( length )
+                if seq != self.seq:
+                    continue
+                if kind == NLMSG_DONE:
+                    return replies
+                if kind == NLMSG_ERROR:
+                    err = -struct.unpack_from( '=i', payload )[ 0 ]
+                    if err:
+                        raise OSError( err, os.strerror( err ), name )
+                    return replies
+                replies.append( ( kind, payload ) )
+
+    def link( self, name, flags=0, change=0, index=0, attributes=None ):
+        """Change a link's settings
+           name: interface name
+           flags: interface flags to set
+           change: mask of interface flags to change
+           index: interface index, to look up by index rather than name
+           attributes: additional encoded attributes"""
+        body = IFINFOMSG.pack( socket.AF_UNSPEC, 0, index, flags, change )
+        if not index:
+            body += attr( IFLA_IFNAME, name + '\0' )
+        body += ''.join( attributes or [] )
+        self.request( RTM_NEWLINK, 0, body, name )
+
+    def linkInfo( self, name ):
+        """Look up a link
+           name: interface name
+           returns: index, flags, MAC address"""
+        body = ( IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 ) +
+                 attr( IFLA_IFNAME, name + '\0' ) )
+        _kind, payload = self.request( RTM_GETLINK, 0, body, name )[ 0 ]
+        _family, _type, index, flags, _change = IFINFOMSG.unpack_from(
+            payload )
+        mac = attrs( payload[ IFINFOMSG.size: ] ).get( IFLA_ADDRESS )
+        return index, flags, bytesToMac( mac ) if mac else None
+
+    def dumpIntfs( self ):
+        """Look up all links and their first IPv4 addresses at once
+           returns: { name: { 'up', 'mac', 'ip', 'prefixLen' } }"""
+        state, names = {}, {}
+        for _kind, payload in self.request(
+                RTM_GETLINK, NLM_F_DUMP,
+                IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 ) ):
+            _family, kind, index, flags, _change = IFINFOMSG.unpack_from(
+                payload )
+            attributes = attrs( payload[ IFINFOMSG.size: ] )
+            name = attributes.get( IFLA_IFNAME, '' ).rstrip( '\0' )
+            mac = attributes.get( IFLA_ADDRESS )
+            names[ index ] = name
+            state[ name ] = dict(
+                up=bool( flags & IFF_UP ), ip=None, prefixLen=None,
+                mac=bytesToMac( mac ) if mac and kind == ARPHRD_ETHER
+                else None )
+        for _kind, payload in self.request(
+                RTM_GETADDR, NLM_F_DUMP,
+                IFADDRMSG.pack( socket.AF_INET, 0, 0, 0, 0 ) ):
+            family, prefixLen, _flags, _scope, index = IFADDRMSG.unpack_from(
+                payload )
+            local = attrs( payload[ IFADDRMSG.size: ] ).get( IFA_LOCAL )
+            intf = state.get( names.get( index ) )
+            if ( family == socket.AF_INET and local and intf and
+                 intf[ 'ip' ] is None ):
+                intf.update( ip=socket.inet_ntoa( local ),
+                             prefixLen=prefixLen )
+        return state
+
+    def addVeth( self, name1, name2, addr1=None, addr2=None, pid1=None,
+                 pid2=None, txqueues=None, rxqueues=None ):
+        """Create a veth pair
+           name1, name2: interface names
+           addr1, addr2: MAC addresses (optional)
+           pid1, pid2: pids whose namespaces the interfaces should be
+             created in (optional; default is our namespace)
+           txqueues, rxqueues: numbers of queues for each interface
+             (optional)"""
+        queues = dict( txqueues=txqueues, rxqueues=rxqueues )
+        peer = ( IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 ) +
+                 ''.join( linkAttrs( name2, addr2, pid=pid2, **queues ) ) )
+        info = attr( IFLA_LINKINFO, [
+            attr( IFLA_INFO_KIND, 'veth' ),
+            attr( IFLA_INFO_DATA, [ attr( VETH_INFO_PEER, peer ) ] ) ] )
+        body = ( IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 ) +
+                 ''.join( linkAttrs( name1, addr1, pid=pid1, **queues ) ) +
+                 info )
+        self.request( RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, body,
+                      '%s,%s' % ( name1, name2 ) )
+
+    def delLink( self, name ):
+        "Delete a link"
+        body = ( IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 ) +
+                 attr( IFLA_IFNAME, name + '\0' ) )
+        self.request( RTM_DELLINK, 0, body, name )
+
+    def setUp( self, name, up=True ):
+        "Set a link up or down"
+        self.link( name, IFF_UP if up else 0, IFF_UP )
+
+    def setMAC( self, name, mac ):
+        "Set a link's MAC address, taking it down while doing so"
+        self.setUp( name, False )
+        self.link( name, IFF_UP, IFF_UP, attributes=linkAttrs( mac=mac ) )
+
+    def setMTU( self, name, mtu ):
+        "Set a link's MTU"
+        self.link( name, attributes=linkAttrs( mtu=mtu ) )
+
+    def rename( self, name, newname ):
+        "Rename a link, taking it down while doing so"
+        index, _flags, _mac = self.linkInfo( name )
+        self.setUp( name, False )
+        self.link( name, IFF_UP, IFF_UP, index=index,
+                   attributes=linkAttrs( name=newname ) )
+
+    def moveLink( self, name, pid ):
+        "Move a link to the namespace of process pid"
+        self.link( name, attributes=linkAttrs( pid=pid ) )
+
+    def setIP( self, name, ip, prefixLen ):
+        """Set a link's IPv4 address and bring it up, replacing any
+           existing IPv4 addresses as ifconfig would"""
+        index, _flags, _mac = self.linkInfo( name )
+        dump = self.request( RTM_GETADDR, NLM_F_DUMP,
+                             IFADDRMSG.pack( socket.AF_INET, 0, 0, 0, 0 ),
+                             name )
+        for _kind, payload in dump:
+            family, _plen, _flags, _scope, idx = IFADDRMSG.unpack_from(
+                payload )
+            if idx == index and family == socket.AF_INET:
+                self.request( RTM_DELADDR, 0, payload, name )
+        prefixLen = int( prefixLen )
+        local = socket.inet_aton( ip )
+        mask = ( 0xffffffff << ( 32 - prefixLen ) ) & 0xffffffff
+        bcast = struct.pack( '!I', struct.unpack( '!I', local )[ 0 ] |
+                             ( ~mask & 0xffffffff ) )
+        body = ( IFADDRMSG.pack( socket.AF_INET, prefixLen, 0, 0, index ) +
+                 attr( IFA_LOCAL, local ) + attr( IFA_ADDRESS, local ) +
+                 ( attr( IFA_BROADCAST, bcast ) if prefixLen < 31 else '' ) )
+        self.request( RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL, body, name )
+        self.link( name, IFF_UP, IFF_UP, index=index )
+
+
+def rootNetlink():
+    "Return a shared rtnetlink socket in our own namespace"
+    if not hasattr( rootNetlink, 'nl' ):
+        rootNetlink.nl = RtNetlink()
+    return rootNetlink.nl
+
+def ignoreMissing( fn, *args ):
+    "Call fn( *args ), ignoring a missing interface"
+    try:
+        fn( *args )
+    except OSError as e:
+        if e.errno != errno.ENODEV:
+            raise
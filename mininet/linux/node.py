@@ -7,19 +7,36 @@
 This is a collection of helpers that call the right commands to manipulate these
 components.
 """
+import re
 import signal
 from os import killpg
 
-from subprocess import PIPE, Popen
+from subprocess import PIPE, STDOUT, Popen
 
 from mininet.log import debug
-from mininet.util import quietRun
+from mininet.util import quietRun, intfCaches
 from mininet.basenode import BaseNode
+from mininet.linux.agent import ExecAgent, AgentPopen
+from mininet.linux.netlink import RtNetlink
+from mininet.linux.util import moveIntf
 
 class Node( BaseNode ):
     """A virtual network node that manipulates and tracks namespaces."""
 
+    # Spawn popen() processes via a persistent exec agent?
+    useAgent = False
+    # Manage our interfaces via rtnetlink rather than ip/ifconfig?
+    useNetlink = False
+
     def __init__( self, name, inNamespace=True, **params ):
+        """useAgent: spawn popen() processes via an exec agent in our
+             namespaces, rather than via mnexec (False)
+           useNetlink: create and configure our interfaces via
+             rtnetlink, rather than via ip and ifconfig (False)"""
+        self.useAgent = params.get( 'useAgent', self.useAgent )
+        self.agent = None
+        self.useNetlink = params.get( 'useNetlink', self.useNetlink )
+        self.nl = None
         BaseNode.__init__( self, name, inNamespace, **params )
 
     def getShell( self, master, slave, mnopts=None ):
@@ -35,8 +52,8 @@ def getShell( self, master, slave, mnopts=None ):
             opts += 'n'
         # bash -i: force interactive
         # -s: pass $* to shell, and make process easy to find in ps
-        # prompt is set to sentinel chr( 127 )
-        cmd = [ 'mnexec', opts, 'env', 'PS1=' + chr( 127 ),
+        # prompt is set to exit status and sentinel chr( 127 )
+        cmd = [ 'mnexec', opts, 'env', 'PS1=' + self.prompt,
                 'bash', '--norc', '-is', 'mininet:' + self.name ]
 
         return Popen( cmd, stdin=slave, stdout=slave, stderr=slave,
@@ -71,17 +88,29 @@ def unmountPrivateDirs( self ):
     def terminate( self ):
         """ Cleanup when node is killed.  """
         self.unmountPrivateDirs()
+        if self.agent:
+            self.agent.stop()
+            self.agent = None
+        if self.nl:
+            self.nl.close()
+            self.nl = None
+        self.clearIntfState()
         if self.shell:
             if self.shell.poll() is None:
                 killpg( self.shell.pid, signal.SIGHUP )
         self.cleanup()
 
     def popen( self, *args, **kwargs ):
-        """Return a Popen() object in our namespace
+        """Return a Popen() object in our namespace; since the command
+           may change our interfaces, we forget their cached state, but
+           call clearIntfState() after changes which it makes later
            args: Popen() args, single list, or string
            kwargs: Popen() keyword args"""
+        self.clearIntfState()
         defaults = { 'stdout': PIPE, 'stderr': PIPE,
                      'mncmd': [ 'mnexec', '-da', str( self.pid ) ] }
+        if self.canUseAgent( kwargs ):
+            defaults.update( mncmd=[], popen=self.agentPopen )
         defaults.update( kwargs )
         if len( args ) == 1:
             if isinstance( args[ 0 ], list ):
@@ -103,8 +132,115 @@ def popen( self, *args, **kwargs ):
         popen = self._popen( cmd, **defaults )
         return popen
 
+    def canUseAgent( self, kwargs ):
+        """Can our exec agent spawn a process with these popen() args?
+           It can't run preexec_fn, and its children can only open
+           pipes and our own stdio, not arbitrary descriptors."""
+        if not self.useAgent:
+            return False
+        if set( kwargs ) & set( [ 'mncmd', 'popen', 'preexec_fn' ] ):
+            return False
+        return all( kwargs.get( name ) in ( None, PIPE, STDOUT )
+                    for name in ( 'stdin', 'stdout', 'stderr' ) )
+
+    def agentPopen( self, cmd, **params ):
+        """Spawn a process via our exec agent, starting it if necessary
+           cmd: command to run (list)
+           params: parameters to Popen()"""
+        if not self.agent:
+            self.agent = ExecAgent( self )
+        return AgentPopen( self.agent, cmd, **params )
+
+    _intfStateCmd = 'ip -o link show; ip -o -4 addr show'
+    _linkStateRegex = re.compile(
+        r'^\d+: ([^:@\s]+)(?:@\S+)?: <([^>]*)>(?:.*?link/ether (\S+))?',
+        re.MULTILINE )
+    _addrStateRegex = re.compile(
+        r'^\d+: (\S+)\s+inet (\d+\.\d+\.\d+\.\d+)/(\d+)', re.MULTILINE )
+
+    def intfState( self ):
+        """Return the state of every interface in our namespace, from
+           a single ip (or rtnetlink) dump which is cached until we
+           change an interface or run a command
+           returns: { name: { 'up', 'mac', 'ip', 'prefixLen' } }"""
+        key = self.pid if self.inNamespace else None
+        state = intfCaches.get( key )
+        if state is not None:
+            return state
+        nl = self.netlink()
+        if nl:
+            state = nl.dumpIntfs()
+        else:
+            # Use pexec() rather than our shell, which may be running
+            # a command in the background
+            dump, _err, _code = self.pexec(
+                [ 'sh', '-c', self._intfStateCmd ] )
+            state = {}
+            for name, flags, mac in self._linkStateRegex.findall( dump ):
+                state[ name ] = dict( up='UP' in flags.split( ',' ),
+                                      mac=mac or None, ip=None,
+                                      prefixLen=None )
+            for name, ip, prefixLen in self._addrStateRegex.findall( dump ):
+                if name in state and state[ name ][ 'ip' ] is None:
+                    state[ name ].update( ip=ip, prefixLen=int( prefixLen ) )
+        intfCaches[ key ] = state
+        return state
+
+    def clearIntfState( self, root=False ):
+        """Forget our cached interface state (see intfState())
+           root: also forget the state of our own namespace"""
+        intfCaches.pop( self.pid if self.inNamespace else None, None )
+        if root:
+            intfCaches.pop( None, None )
+
+    def sendCmd( self, *args, **kwargs ):
+        "Send a command, which may change our interfaces"
+        self.clearIntfState()
+        return BaseNode.sendCmd( self, *args, **kwargs )
+
+    def pexec( self, *args, **kwargs ):
+        """Execute a command using popen, and forget our cached interface
+           state once it has finished
+           returns: out, err, exitcode"""
+        try:
+            return BaseNode.pexec( self, *args, **kwargs )
+        finally:
+            self.clearIntfState()
+
+    def cmdBatch( self, cmds, verbose=False ):
+        "Send commands, which may change our interfaces, all at once"
+        self.clearIntfState()
+        return BaseNode.cmdBatch( self, cmds, verbose=verbose )
+
+    def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
+        "Add an interface, which may have been moved from our namespace"
+        self.clearIntfState( root=True )
+        return BaseNode.addIntf( self, intf, port=port,
+                                 moveIntfFn=moveIntfFn )
+
+    def delIntf( self, intf ):
+        "Remove an interface from our known interfaces"
+        self.clearIntfState()
+        return BaseNode.delIntf( self, intf )
+
+    def netlink( self ):
+        """Return an rtnetlink socket in our network namespace,
+           or None if we don't use one"""
+        if not self.useNetlink:
+            return None
+        if not self.nl:
+            self.nl = RtNetlink( self.pid if self.inNamespace else None )
+        return self.nl
+
     def sendInt( self, intr=chr( 3 ) ):
         "Interrupt running command."
+        if not self.usePty:
+            # No terminal to turn ^C into SIGINT, so signal our shell's
+            # process group: the (interactive) shell ignores SIGINT,
+            # as do background commands since job control is off
+            debug( 'sendInt: sending SIGINT to %d\n' % self.pid )
+            killpg( self.pid, signal.SIGINT )
+            return
         debug( 'sendInt: writing chr(%d)\n' % ord( intr ) )
         self.write( intr )
 
@@ -2,9 +2,14 @@
 OS-specific utility functions for Linux, counterpart to util.py.
 """
 
+from os import getpid, listdir, killpg
+from signal import SIGHUP, SIGKILL
+from time import sleep, time
 from resource import getrlimit, setrlimit, RLIMIT_NPROC, RLIMIT_NOFILE
+from subprocess import Popen, PIPE, STDOUT
 from mininet.log import error, warn, debug
-from mininet.util import ( errRun, quietRun, retry )
+from mininet.util import ( errRun, quietRun, retry, intfCaches )
+from mininet.linux.netlink import rootNetlink, ignoreMissing
 
 
 LO='lo'                   # loopback name.
@@ -22,9 +27,22 @@
 # For the kernel datapath, switch interfaces
 # live in the root namespace and thus do not have to be
 # explicitly moved.
+#
+# Nodes with useNetlink set have their interfaces created, moved and
+# configured via rtnetlink (see netlink.py) rather than ip and ifconfig.
+
+def nodeNetlink( node ):
+    "Return node's rtnetlink socket, or None if it doesn't use one"
+    netlink = getattr( node, 'netlink', None )
+    return netlink() if netlink else None
+
+def nodePid( node ):
+    "Return pid of a process in node's network namespace"
+    return node.pid if node and node.inNamespace else getpid()
 
 def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
-                  deleteIntfs=True, runCmd=None ):
+                  deleteIntfs=True, runCmd=None, numtxqueues=None,
+                  numrxqueues=None ):
     """Make a veth pair connnecting new interfaces intf1 and intf2
        intf1: name for interface 1
        intf2: name for interface 2
@@ -34,7 +52,15 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
        node2: home node for interface 2 (optional)
        deleteIntfs: delete intfs before creating them
        runCmd: function to run shell commands (quietRun)
+       numtxqueues: number of transmit queues for each intf (optional)
+       numrxqueues: number of receive queues for each intf (optional)
        raises Exception on failure"""
+    intfCaches.clear()
+    nl = nodeNetlink( node1 ) if not runCmd else None
+    if nl:
+        return makeIntfPairNetlink( nl, intf1, intf2, addr1, addr2,
+                                    node2, deleteIntfs,
+                                    numtxqueues, numrxqueues )
     if not runCmd:
         runCmd = quietRun if not node1 else node1.cmd
         runCmd2 = quietRun if not node2 else node2.cmd
@@ -44,17 +70,20 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
         runCmd2( deleteCmd( intf2 ) )
     # Create new pair
     netns = 1 if not node2 else node2.pid
+    queues = queueOpts( numtxqueues, numrxqueues )
     if addr1 is None and addr2 is None:
-        cmdOutput = runCmd( 'ip link add name %s '
-                            'type veth peer name %s '
-                            'netns %s' % ( intf1, intf2, netns ) )
+        cmdOutput = runCmd( 'ip link add name %s %s'
+                            'type veth peer name %s %s'
+                            'netns %s' % ( intf1, queues, intf2, queues,
+                                           netns ) )
     else:
         cmdOutput = runCmd( 'ip link add name %s '
-                            'address %s '
+                            'address %s %s'
                             'type veth peer name %s '
-                            'address %s '
+                            'address %s %s'
                             'netns %s' %
-                            (  intf1, addr1, intf2, addr2, netns ) )
+                            (  intf1, addr1, queues, intf2, addr2, queues,
+                               netns ) )
     if cmdOutput:
         raise Exception( "Error creating interface pair (%s,%s): %s " %
                          ( intf1, intf2, cmdOutput ) )
@@ -62,18 +91,123 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
     return intf1, intf2
 
 
+def queueOpts( numtxqueues=None, numrxqueues=None ):
+    "Return ip link options for numbers of queues, if given"
+    return ''.join( '%s %d ' % ( opt, count ) for opt, count in
+                    ( ( 'numtxqueues', numtxqueues ),
+                      ( 'numrxqueues', numrxqueues ) ) if count )
+
+
+def makeIntfPairNetlink( nl, intf1, intf2, addr1, addr2, node2,
+                         deleteIntfs, numtxqueues=None, numrxqueues=None ):
+    """Make a veth pair via rtnetlink; see makeIntfPair()
+       nl: rtnetlink socket in node1's namespace, where intf1 goes
+       raises OSError on failure"""
+    if deleteIntfs:
+        ignoreMissing( nl.delLink, intf1 )
+        nl2 = nodeNetlink( node2 ) if node2 else rootNetlink()
+        if nl2:
+            ignoreMissing( nl2.delLink, intf2 )
+        else:
+            node2.cmd( deleteCmd( intf2 ) )
+    nl.addVeth( intf1, intf2, addr1, addr2, pid2=nodePid( node2 ),
+                txqueues=numtxqueues, rxqueues=numrxqueues )
+    return intf1, intf2
+
+
+def makeIntfPairs( pairs ):
+    """Make many veth pairs at once, with a single ip -batch command
+       in the root namespace which creates each end directly in its
+       node's namespace.
+       pairs: list of ( intf1, intf2, addr1, addr2, node1, node2 ),
+         as for makeIntfPair()
+       raises Exception on failure"""
+    intfCaches.clear()
+    cmds = []
+    for intf1, intf2, addr1, addr2, node1, node2 in pairs:
+        ends = []
+        for intf, addr, node in ( ( intf1, addr1, node1 ),
+                                  ( intf2, addr2, node2 ) ):
+            end = 'name %s ' % intf
+            if addr:
+                end += 'address %s ' % addr
+            end += 'netns %s' % nodePid( node )
+            ends.append( end )
+        cmds.append( 'link add %s type veth peer %s' % tuple( ends ) )
+    popen = Popen( [ 'ip', '-batch', '-' ], stdin=PIPE, stdout=PIPE,
+                   stderr=STDOUT )
+    cmdOutput, _ = popen.communicate( '\n'.join( cmds ) + '\n' )
+    if popen.returncode or cmdOutput:
+        raise Exception( "Error creating interface pairs: %s" % cmdOutput )
+
+
 def deleteCmd( intf, node=None ):
     """Command to destroy an interface."""
     return 'ip link del ' + intf
 
+def killShells( shells, sig=SIGHUP ):
+    """Signal the process groups of node shells, which mnexec -d
+       made group leaders, without waiting for them
+       shells: shell Popen objects
+       sig: signal to send (SIGHUP)"""
+    for shell in shells:
+        if shell.poll() is None:
+            try:
+                killpg( shell.pid, sig )
+            except OSError:
+                pass  # already gone
+
+def waitReaped( shells, intfs, timeout=5, delay=.01, killTimeout=1 ):
+    """Wait for killed node shells to exit, and for interfaces to be
+       deleted along with their peers' namespaces. Shells which outlast
+       the timeout have their process groups killed, and get another
+       killTimeout seconds; interfaces which outlast it are deleted.
+       shells: shell Popen objects
+       intfs: names of interfaces in the root namespace
+       timeout: time to wait in seconds (5)
+       delay: seconds to sleep per iteration
+       killTimeout: time to wait after killing stragglers (1)"""
+    end = time() + timeout
+    shells, intfs = list( shells ), set( intfs )
+    killed = False
+    while True:
+        shells = [ shell for shell in shells if shell.poll() is None ]
+        intfs &= set( listdir( '/sys/class/net' ) )
+        if not shells and not intfs:
+            break
+        if time() > end:
+            if killed or not shells:
+                break
+            for shell in shells:
+                warn( '*** Killing shell %d which did not exit\n' %
+                      shell.pid )
+            killShells( shells, SIGKILL )
+            killed, end = True, time() + killTimeout
+        sleep( delay )
+    for shell in shells:
+        warn( '*** Shell %d did not exit after being killed\n' %
+              shell.pid )
+    for intf in intfs:
+        warn( '*** Deleting interface %s which outlived its peer\n' % intf )
+        quietRun( deleteCmd( intf ) )
+
+
 def moveIntfNoRetry( intf, dstNode, printError=False ):
     """Move interface to node, without retrying.
        intf: string, interface
         dstNode: destination Node
         printError: if true, print error"""
+    intfCaches.clear()
     intf = str( intf )
-    cmd = 'ip link set %s netns %s' % ( intf, dstNode.pid )
-    cmdOutput = quietRun( cmd )
+    if nodeNetlink( dstNode ):
+        try:
+            rootNetlink().moveLink( intf, dstNode.pid )
+            return True
+        except OSError as e:
+            cmdOutput = str( e )
+    else:
+        cmd = 'ip link set %s netns %s' % ( intf, dstNode.pid )
+        cmdOutput = quietRun( cmd )
     # If ip link set does not produce any output, then we can assume
     # that the link has been moved successfully.
     if cmdOutput:
@@ -171,6 +305,36 @@ def numCores():
         return 0
     return numCores.ncores
 
+def coreList( cores ):
+    """Return list of core numbers
+       cores: core number, list of them, or cpuset list (e.g. '0-2,4')"""
+    if isinstance( cores, ( int, long ) ):
+        return [ cores ]
+    if not isinstance( cores, basestring ):
+        return [ int( core ) for core in cores ]
+    result = []
+    for item in cores.split( ',' ):
+        if '-' in item:
+            first, last = item.split( '-' )
+            result += range( int( first ), int( last ) + 1 )
+        elif item.strip():
+            result.append( int( item ) )
+    return result
+
+def cpuMask( cores ):
+    """Return CPU mask for sysfs (e.g. rps_cpus): hex digits, in
+       comma-separated 32-bit words
+       cores: list of core numbers"""
+    mask = 0
+    for core in cores:
+        mask |= 1 << core
+    words = [ '%08x' % ( mask & 0xffffffff ) ]
+    mask >>= 32
+    while mask:
+        words.insert( 0, '%08x' % ( mask & 0xffffffff ) )
+        mask >>= 32
+    return ','.join( words )
+
 # Kernel module manipulation
 
 def lsmod():
@@ -93,29 +93,32 @@
 import random
 
 from time import sleep
-from itertools import chain, groupby
+from itertools import chain, groupby, islice
 from math import ceil
 
 plat = os.uname()[ 0 ]
 if plat == 'FreeBSD':
     from mininet.freebsd.node import Node
     from mininet.freebsd.intf import Intf
-    from mininet.freebsd.util import fixLimits, numCores
+    from mininet.freebsd.util import ( fixLimits, numCores, killShells,
+                                       waitReaped )
 elif plat == 'Linux':
     from mininet.linux.node import Node
     from mininet.linux.intf import Intf
-    from mininet.linux.util import fixLimits, numCores
+    from mininet.linux.util import ( fixLimits, numCores, killShells,
+                                     waitReaped )
 else:
     from mininet.openbsd.node import Node
     from mininet.openbsd.intf import Intf
-    from mininet.openbsd.util import fixLimits, numCores
+    from mininet.openbsd.util import ( fixLimits, numCores, killShells,
+                                       waitReaped )
 
 from mininet.cli import CLI
 from mininet.log import info, error, debug, output, warn
 from mininet.node import ( Host, KernelSwitch, DefaultController,
                            Controller, RctlHost )
 from mininet.nodelib import NAT
-from mininet.link import Link
+from mininet.link import Link, TCIntf
 from mininet.util import ( quietRun, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
                            waitListening )
@@ -127,12 +130,16 @@
 class Mininet( object ):
     "Network emulation with hosts spawned in network namespaces."
 
+    # Number of topo links to add at a time with streamLinks
+    linkChunk = 1000
+
     def __init__( self, topo=None, switch=KernelSwitch, host=Host,
                   controller=DefaultController, link=Link, intf=Intf,
                   build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                   inNamespace=False,
                   autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                  listenPort=None, waitConnected=False ):
+                  listenPort=None, waitConnected=False, batchLinks=False,
+                  fastStop=False, streamLinks=False ):
         """Create Mininet object.
            topo: Topo (topology) object or None
            switch: default Switch class
@@ -149,7 +156,15 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
            autoStaticArp: set all-pairs static MAC addrs?
            autoPinCpus: pin hosts to (real) cores (requires CPULimitedHost)?
            listenPort: base listening port to open; will be incremented for
-               each additional switch in the net if inNamespace=False"""
+               each additional switch in the net if inNamespace=False
+           batchLinks: create topo links' interfaces in batches?
+           fastStop: have stop() leave interfaces to be deleted along
+               with their nodes' namespaces?
+           streamLinks: add topo links linkChunk at a time, as
+               topo.iterLinks() returns them, rather than sorting them
+               all first? (The topo is still built first; links are in
+               insertion order with CompactGraph, or dict order with
+               MultiGraph)"""
         self.topo = topo
         self.switch = switch
         self.host = host
@@ -171,6 +186,9 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
         self.nextCore = 0  # next core for pinning hosts to CPUs
         self.listenPort = listenPort
         self.waitConn = waitConnected
+        self.batchLinks = batchLinks
+        self.fastStop = fastStop
+        self.streamLinks = streamLinks
 
         self.hosts = []
         self.switches = []
@@ -415,6 +433,43 @@ def addLink( self, node1, node2, port1=None, port2=None,
         self.links.append( link )
         return link
 
+    def canBatch( self, params ):
+        """Can makeLinkIntfs() create the interfaces for a link?
+           params: link params as from topo.links()"""
+        cls = params.get( 'cls', self.link )
+        if not isinstance( cls, type ) or not issubclass( cls, Link ):
+            return False
+        if not cls.canBatch() or not params.get( 'fast', True ):
+            return False
+        if params.get( 'numtxqueues' ) or params.get( 'numrxqueues' ):
+            return False
+        return ( params.get( 'port1' ) is not None and
+                 params.get( 'port2' ) is not None )
+
+    def makeLinkIntfs( self, links ):
+        """Create the interfaces for many links at once where possible,
+           and update their params so that addLink() will use them.
+           links: list of ( src, dst, params ) as from topo.links()"""
+        pairs, batched = [], []
+        for _src, _dst, params in links:
+            if not self.canBatch( params ):
+                continue
+            cls = params.get( 'cls', self.link )
+            node1, node2 = self[ params[ 'node1' ] ], self[ params[ 'node2' ] ]
+            params.setdefault( 'intfName1',
+                               cls.intfName( node1, params[ 'port1' ] ) )
+            params.setdefault( 'intfName2',
+                               cls.intfName( node2, params[ 'port2' ] ) )
+            params.setdefault( 'addr1', self.randMac() )
+            params.setdefault( 'addr2', self.randMac() )
+            pairs.append( ( params[ 'intfName1' ], params[ 'intfName2' ],
+                            params[ 'addr1' ], params[ 'addr2' ],
+                            node1, node2 ) )
+            batched.append( params )
+        if pairs and Link.makeIntfPairs( pairs ):
+            for params in batched:
+                params[ 'created' ] = True
+
     def delLink( self, link ):
         "Remove a link from this network"
         link.delete()
@@ -482,9 +537,13 @@ def buildFromTopo( self, topo=None ):
                 else:
                     self.addController( 'c%d' % i, cls )
 
+        # Start node shells without waiting for each of them;
+        # we wait for all of them at once in waitShells()
         info( '*** Adding hosts:\n' )
         for hostName in topo.hosts():
-            self.addHost( hostName, **topo.nodeInfo( hostName ) )
+            params = dict( { 'waitShell': False },
+                           **topo.nodeInfo( hostName ) )
+            self.addHost( hostName, **params )
             info( hostName + ' ' )
 
         info( '\n*** Adding switches:\n' )
@@ -494,17 +553,55 @@ def buildFromTopo( self, topo=None ):
             cls = params.get( 'cls', self.switch )
             if hasattr( cls, 'batchStartup' ):
                 params.setdefault( 'batch', True )
+            params = dict( { 'waitShell': False }, **params )
             self.addSwitch( switchName, **params )
             info( switchName + ' ' )
 
-        info( '\n*** Adding links:\n' )
-        for srcName, dstName, params in topo.links(
-                sort=True, withInfo=True ):
-            self.addLink( **params )
-            info( '(%s, %s) ' % ( srcName, dstName ) )
+        self.waitShells( self.hosts + self.switches )
 
+        info( '\n*** Adding links:\n' )
+        self.addTopoLinks( topo )
         info( '\n' )
 
+    def addTopoLinks( self, topo ):
+        """Add topo's links, in batches if batchLinks is set
+           topo: Topo (topology) object"""
+        if self.streamLinks:
+            # Topos build their whole graph up front, so this doesn't
+            # overlap link creation with topo generation; it only saves
+            # copying and sorting every link at once
+            links = topo.iterLinks( withInfo=True )
+            chunk = self.linkChunk
+        else:
+            links = topo.links( sort=True, withInfo=True )
+            chunk = None
+        deferral = None
+        if self.batchLinks:
+            deferral = TCIntf.deferConfig( self.hosts + self.switches )
+        try:
+            for batch in self.linkChunks( links, chunk ):
+                if self.batchLinks:
+                    self.makeLinkIntfs( batch )
+                for srcName, dstName, params in batch:
+                    self.addLink( **params )
+                    info( '(%s, %s) ' % ( srcName, dstName ) )
+        finally:
+            if deferral is not None:
+                TCIntf.batchConfig( deferral )
+
+    @staticmethod
+    def linkChunks( links, size=None ):
+        """Generator: split links into lists, copying their params
+           links: iterable of ( src, dst, params ) as from topo.links()
+           size: maximum list length (default: one list for all links)"""
+        links = iter( links )
+        while True:
+            chunk = [ ( src, dst, dict( params ) )
+                      for src, dst, params in islice( links, size ) ]
+            if not chunk:
+                return
+            yield chunk
+
     def configureControlNetwork( self ):
         "Control net config hook: override in subclass"
         raise Exception( 'configureControlNetwork: '
@@ -572,8 +669,15 @@ def start( self ):
         if self.waitConn:
             self.waitConnected()
 
-    def stop( self ):
-        "Stop the controller(s), switches and hosts"
+    def stop( self, fast=None ):
+        """Stop the controller(s), switches and hosts
+           fast: rather than deleting interfaces one by one, let them
+                 go away with their nodes' namespaces, and wait for
+                 all of the nodes at once (default: fastStop)"""
+        if fast is None:
+            fast = self.fastStop
+        # Only Linux deletes interfaces along with their namespaces
+        fast = fast and waitReaped is not None
         info( '*** Stopping %i controllers\n' % len( self.controllers ) )
         for controller in self.controllers:
             info( controller.name + ' ' )
@@ -582,11 +686,48 @@ def stop( self ):
         if self.terms:
             info( '*** Stopping %i terms\n' % len( self.terms ) )
             self.stopXterms()
+        doomed = self.stopLinks( fast )
+        self.stopSwitches( fast )
+        # Shells we will kill and must wait for
+        shells = []
+        if fast:
+            # Signal all of the nodes' process groups before cleaning
+            # up after any of them, so that they exit in parallel; nodes
+            # with private dirs still need their shells to unmount them
+            shells = [ node.shell for node in self.switches + self.hosts
+                       if node.shell ]
+            killShells( [ node.shell for node in self.switches + self.hosts
+                          if node.shell and not node.privateDirs ] )
+        info( '*** Terminating %i switches and %i hosts\n' %
+              ( len( self.switches ), len( self.hosts ) ) )
+        for node in self.switches + self.hosts:
+            info( node.name + ' ' )
+            node.terminate()
+        if fast:
+            info( '\n*** Waiting for nodes to exit' )
+            waitReaped( shells, doomed )
+        info( '\n*** Done\n' )
+
+    def stopLinks( self, fast=False ):
+        """Stop our links
+           fast: skip links which will go away with their namespaces
+           returns: names of their interfaces in our namespace"""
         info( '*** Stopping %i links\n' % len( self.links ) )
+        doomed = []
         for link in self.links:
             info( '.' )
-            link.stop()
+            if fast and link.diesWithNamespace():
+                doomed += [ intf.name for intf in ( link.intf1, link.intf2 )
+                            if not intf.node.inNamespace ]
+            else:
+                link.stop()
         info( '\n' )
+        return doomed
+
+    def stopSwitches( self, fast=False ):
+        """Stop our switches, using batchShutdown() where possible,
+           but leave them to be terminated by stop()
+           fast: leave switches' interfaces to their namespaces"""
         info( '*** Stopping %i switches\n' % len( self.switches ) )
         stopped = {}
         for swclass, switches in groupby(
@@ -597,15 +738,13 @@ def stop( self ):
                 stopped.update( { s: s for s in success } )
         for switch in self.switches:
             info( switch.name + ' ' )
-            if switch not in stopped:
+            if switch in stopped:
+                continue
+            if fast:
+                switch.stop( deleteIntfs=False )
+            else:
                 switch.stop()
-            switch.terminate()
         info( '\n' )
-        info( '*** Stopping %i hosts\n' % len( self.hosts ) )
-        for host in self.hosts:
-            info( host.name + ' ' )
-            host.terminate()
-        info( '\n*** Done\n' )
 
     def run( self, test, *args, **kwargs ):
         "Perform a complete start/test/stop cycle."
@@ -639,6 +778,82 @@ def monitor( self, hosts=None, timeoutms=-1 ):
             if not ready and timeoutms >= 0:
                 yield None, None
 
+    def cmdMap( self, cmds, verbose=False, **kwargs ):
+        """Run commands on many nodes concurrently and wait for all of
+           them to complete.
+           cmds: dict of nodes (or names) to commands
+           verbose: print output interactively
+           kwargs: additional arguments for sendCmd()
+           returns: dict of nodes to output"""
+        log = info if verbose else debug
+        outputs, poller = {}, select.poll()
+        # Send every command before waiting on any of them, so that
+        # the total time is roughly that of the slowest command
+        for node, cmd in cmds.items():
+            node = node if not isinstance( node, basestring ) else self[ node ]
+            log( '*** %s : %s\n' % ( node.name, cmd ) )
+            if not node.shell:
+                warn( '(%s exited - ignoring cmd %s)\n' % ( node, cmd ) )
+                continue
+            node.sendCmd( cmd, **kwargs )
+            outputs[ node ] = ''
+            poller.register( node.stdout, select.POLLIN )
+        # Drain all of the shells from a single poll() loop
+        waiting = len( outputs )
+        while waiting:
+            for fd, event in poller.poll():
+                node = Node.fdToNode( fd )
+                if event & select.POLLIN:
+                    data = node.monitor()
+                    outputs[ node ] += data
+                    log( data )
+                else:
+                    # POLLHUP or POLLERR: shell has gone away
+                    node.waiting = False
+                if not node.waiting:
+                    poller.unregister( fd )
+                    waiting -= 1
+        return outputs
+
+    def waitShells( self, nodes=None ):
+        """Wait for shells started with waitShell=False from a single
+           poll() loop, and then initialize all of them concurrently.
+           nodes: list of nodes, or None for all nodes"""
+        if nodes is None:
+            nodes = self.controllers + self.switches + self.hosts
+        starting = [ node for node in nodes if node.starting ]
+        poller = select.poll()
+        for node in starting:
+            poller.register( node.stdout, select.POLLIN )
+        remaining = len( starting )
+        while remaining:
+            for fd, event in poller.poll():
+                node = Node.fdToNode( fd )
+                if event & select.POLLIN:
+                    if not node.readPrompt():
+                        continue
+                else:
+                    # POLLHUP or POLLERR: shell has gone away
+                    error( '%s: shell exited during startup\n' % node )
+                    node.starting = False
+                    starting.remove( node )
+                poller.unregister( fd )
+                remaining -= 1
+        self.cmdMap( dict( ( node, node.shellInitCmd() )
+                           for node in starting ) )
+
+    def cmdAll( self, nodes, cmd, verbose=False, **kwargs ):
+        """Run the same command on many nodes concurrently.
+           nodes: list of nodes (or names), or None for all hosts
+           cmd: command to run, as a string
+           verbose: print output interactively
+           kwargs: additional arguments for sendCmd()
+           returns: dict of nodes to output"""
+        if nodes is None:
+            nodes = self.hosts
+        return self.cmdMap( dict( ( node, cmd ) for node in nodes ),
+                            verbose=verbose, **kwargs )
+
     # XXX These test methods should be moved out of this class.
     # Probably we should create a tests.py for them
 
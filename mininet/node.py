@@ -18,6 +18,9 @@
 CPULimitedHost: a virtual host whose CPU bandwidth is limited by
     RT or CFS bandwidth limiting.
 
+LightweightHost: a virtual host without a shell, whose commands run
+    as separate processes in its namespace.
+
 Switch: superclass for switch nodes.
 
 UserSwitch: a switch using the user-space switch from the OpenFlow
@@ -54,7 +57,10 @@
 
 import os
 import re
-from subprocess import Popen
+import select
+import signal
+import socket
+from subprocess import Popen, PIPE, STDOUT
 from time import sleep
 
 plat = os.uname()[ 0 ]
@@ -111,6 +117,7 @@ def __init__( self, name, sched='cfs', **kwargs ):
         # still does better with larger period values.
         self.period_us = kwargs.get( 'period_us', 100000 )
         self.sched = sched
+        self.cores = None  # cores we are pinned to, if any
         if sched == 'rt':
             self.checkRtGroupSched()
             self.rtprio = 20
@@ -259,6 +266,10 @@ def setCPUs( self, cores, mems=0 ):
         # cpus and mems
         errFail( 'cgclassify -g cpuset:/%s %s' % (
                  self.name, self.pid ) )
+        # Steer our interfaces' packet processing to the same cores
+        self.cores = cores
+        for intf in self.intfList():
+            intf.setCPUs( cores )
 
     def config( self, cpu=-1, cores=None, **params ):
         """cpu: desired overall system CPU fraction
@@ -379,6 +390,150 @@ def getCPUTime( self, pid ):
 CPULimitedHost = RctlHost if os.uname()[ 0 ] == 'FreeBSD' else CgroupHost
 
 
+class LightweightHost( Host ):
+    """A host without a shell. A holder process pins the host's
+       namespaces, and each command runs in its own process which
+       attaches to them. This saves the memory, pty and file
+       descriptors of an interactive shell, at the cost of a process
+       per command and of shell state (e.g. cd, variables) which
+       does not persist across commands. Linux only."""
+
+    # Command which keeps our namespaces alive
+    holderCmd = 'sleep infinity'
+
+    def __init__( self, name, **kwargs ):
+        # Our running command, and background commands
+        self.proc, self.bgProcs = None, []
+        Host.__init__( self, name, **kwargs )
+
+    def startShell( self, mnopts=None, wait=True ):
+        "Start a holder process rather than a shell"
+        if self.shell:
+            error( "%s: shell is already running\n" % self.name )
+            return
+        # mnexec: (c)lose descriptors, (d)etach from tty, run in
+        # (n)amespace, and (p)rint pid once the namespace exists
+        opts = '-cd' if mnopts is None else mnopts
+        if self.inNamespace:
+            opts += 'n'
+        # exec -a: name the holder mininet:<name>, so that it
+        # is easy to find in ps (and to clean up)
+        cmd = [ 'mnexec', opts + 'p', 'bash', '--norc', '-c',
+                'exec -a "$0" ' + self.holderCmd, 'mininet:' + self.name ]
+        self.shell = Popen( cmd, stdout=PIPE, close_fds=True )
+        # Wait for namespace creation
+        self.shell.stdout.readline()
+        self.shell.stdout.close()
+        self.pid = self.shell.pid
+        self.stdin, self.stdout, self.pollOut = None, None, None
+        self.proc = None
+        self.execed = False
+        self.lastCmd = None
+        self.lastPid = None
+        self.lastStatus = None
+        self.readbuf = bytearray()
+        self.waiting = False
+        self.starting = False
+
+    def sendCmd( self, *args, **kwargs ):
+        """Run a command in a new process in our namespace, and return
+           without waiting for it to complete. A command ending with
+           & runs in the background with its output discarded.
+           args: command and arguments, or string"""
+        assert self.shell and not self.waiting
+        self.clearIntfState()
+        # Allow sendCmd( [ list ] )
+        if len( args ) == 1 and isinstance( args[ 0 ], list ):
+            cmd = args[ 0 ]
+        # Allow sendCmd( cmd, arg1, arg2... )
+        elif args:
+            cmd = args
+        # Convert to string
+        if not isinstance( cmd, str ):
+            cmd = ' '.join( [ str( c ) for c in cmd ] )
+        self.closeCmd()
+        self.lastCmd = cmd
+        self.lastPid = None
+        self.lastStatus = None
+        # Output goes to a socket rather than a pipe, since sockets
+        # (unlike pipes) are readable at EOF, as callers who poll()
+        # our stdout for POLLIN expect
+        self.stdout, output = socket.socketpair()
+        if cmd.rstrip().endswith( '&' ):
+            with open( os.devnull, 'r+' ) as devnull:
+                proc = self.popen( [ 'bash', '-c', cmd.rstrip()[ :-1 ] ],
+                                   stdin=devnull, stdout=devnull,
+                                   stderr=devnull )
+            self.bgProcs.append( proc )
+            self.lastPid = proc.pid
+        else:
+            self.proc = self.popen( [ 'bash', '-c', cmd ], stdin=PIPE,
+                                    stdout=output, stderr=STDOUT )
+            self.lastPid = self.proc.pid
+            self.stdin = self.proc.stdin
+        # Leave the command as the only writer to our stdout
+        output.close()
+        self.pollOut = select.poll()
+        self.pollOut.register( self.stdout, select.POLLIN )
+        self.outToNode[ self.stdout.fileno() ] = self
+        self.waiting = True
+
+    def closeCmd( self ):
+        "Close the I/O of our last command."
+        if self.stdout:
+            self.outToNode.pop( self.stdout.fileno(), None )
+            self.stdout.close()
+        if self.stdin:
+            self.stdin.close()
+        self.stdin, self.stdout, self.pollOut = None, None, None
+
+    def readOutput( self, findPid=True ):
+        """Read and return available output of a command. Set
+           self.waiting to False and self.lastStatus to the
+           command's exit status if command has completed.
+           findPid: ignored"""
+        data = self.readChunk()
+        if not data:
+            # End of output: reap the command
+            self.lastStatus = self.proc.wait() if self.proc else 0
+            self.proc = None
+            self.waiting = False
+        return data
+
+    def write( self, data ):
+        """Write data to the running command.
+           data: string"""
+        if self.stdin:
+            os.write( self.stdin.fileno(), data )
+
+    def sendInt( self, intr=chr( 3 ) ):
+        "Interrupt running command."
+        if self.proc and self.proc.poll() is None:
+            # mnexec -d put the command in its own process group
+            os.killpg( self.proc.pid, signal.SIGINT )
+
+    def cmdBatch( self, cmds, verbose=False ):
+        """Run a list of commands one after another.
+           cmds: list of command strings
+           verbose: print output interactively
+           returns: list of ( output, exitcode ) for each command"""
+        results = []
+        for cmd in cmds:
+            output, status, _elapsed = self.cmd( cmd, verbose=verbose,
+                                                 result=True )
+            results.append( ( output, status ) )
+        return results
+
+    def terminate( self ):
+        "Stop background commands and our holder process."
+        for proc in self.bgProcs:
+            if proc.poll() is None:
+                os.killpg( proc.pid, signal.SIGHUP )
+        del self.bgProcs[ : ]
+        self.closeCmd()
+        super( LightweightHost, self ).terminate()
+
+
 # Some important things to note:
 #
 # The "IP" address which setIP() assigns to the switch is not
@@ -769,11 +924,15 @@ def batchStartup( cls, switches, run=errRun ):
                 switch.batch = False
         if cmds:
             run( cmds, shell=True )
-        # Reapply link config if necessary...
-        for switch in switches:
-            for intf in switch.intfs.itervalues():
-                if isinstance( intf, TCIntf ):
-                    intf.config( **intf.params )
+        # Reapply link config if necessary, with one tc -batch
+        deferral = TCIntf.deferConfig( switches )
+        try:
+            for switch in switches:
+                for intf in switch.intfs.itervalues():
+                    if isinstance( intf, TCIntf ):
+                        intf.config( **intf.params )
+        finally:
+            TCIntf.batchConfig( deferral )
         return switches
 
     def stop( self, deleteIntfs=True ):
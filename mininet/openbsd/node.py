@@ -58,8 +58,8 @@ def getShell( self, master, slave, mnopts=None ):
             self.rdid = None
 
         # -s: pass $* to shell, and make process easy to find in ps. The prompt
-        # is set to sentinel chr( 127 ).
-        cmd = execcmd + [ opts, 'env', 'PS1=' + chr( 127 ), '/bin/ksh',
+        # is set to exit status and sentinel chr( 127 ).
+        cmd = execcmd + [ opts, 'env', 'PS1=' + self.prompt, '/bin/ksh',
                           '-is', 'mininet:' + self.name ]
         return Popen( cmd, stdin=slave, stdout=slave, stderr=slave,
                       close_fds=False )
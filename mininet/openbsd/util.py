@@ -60,6 +60,13 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
 
     return pair1, pair2
 
+# Interfaces are created one pair at a time (see makeIntfPair())
+makeIntfPairs = None
+
+# Interfaces outlive their nodes, so Mininet.stop() can't leave them
+# to go away with the nodes (see waitReaped() in linux/util.py)
+killShells = waitReaped = None
+
 
 def deleteCmd( intf, node=None ):
     """Command to destroy an interface. If only intf is specified, assume that
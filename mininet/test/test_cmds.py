@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test command execution on nodes and across the network."""
+
+import unittest
+import os
+import sys
+from fcntl import ioctl
+from functools import partial
+from subprocess import Popen
+from termios import TIOCSCTTY
+
+from mininet.net import Mininet
+from mininet.node import Host, LightweightHost
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.basenode import BaseNode, asyncio
+
+
+class testCmdsCommon( object ):
+    "Switchless network for command tests (common code)."
+
+    N = 10  # number of hosts
+    hostClass = Host
+
+    def setUp( self ):
+        "Create a switchless network of N hosts"
+        self.net = Mininet( host=self.hostClass, controller=None )
+        for i in range( 1, self.N + 1 ):
+            self.net.addHost( 'h%d' % i )
+
+    def tearDown( self ):
+        "Clean up if necessary"
+        self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+
+class testNodeCmds( testCmdsCommon, unittest.TestCase ):
+    "Test command execution on a single host."
+
+    N = 1
+
+    def testCmdBatch( self ):
+        "Batch should return output and exit code of each command"
+        h1 = self.net.hosts[ 0 ]
+        results = h1.cmdBatch( [ 'echo one', 'false', 'echo two' ] )
+        self.assertEqual( [ ( out.strip(), code )
+                            for out, code in results ],
+                          [ ( 'one', 0 ), ( '', 1 ), ( 'two', 0 ) ] )
+        self.assertEqual( h1.cmd( 'echo again' ).strip(), 'again' )
+
+    def testCmdResult( self ):
+        "cmd() should report exit status from the shell prompt"
+        h1 = self.net.hosts[ 0 ]
+        result = h1.cmd( 'echo one; (exit 3)', result=True )
+        self.assertEqual( result.output.strip(), 'one' )
+        self.assertEqual( result.status, 3 )
+        self.assertTrue( result.elapsed >= 0 )
+        self.assertEqual( h1.cmd( 'printf two' ), 'two' )
+        self.assertEqual( h1.lastStatus, 0 )
+
+    def testLargeOutput( self ):
+        "cmd() should return large outputs intact"
+        h1 = self.net.hosts[ 0 ]
+        out = h1.cmd( 'seq 1 20000' )
+        self.assertEqual( out.split(),
+                          [ str( i ) for i in range( 1, 20001 ) ] )
+        self.assertEqual( h1.cmd( 'sleep 0.1 &' ), '' )
+        self.assertTrue( h1.lastPid > 0 )
+
+    def testCmdIter( self ):
+        "cmdIter() should stream lines and survive early exit"
+        h1 = self.net.hosts[ 0 ]
+        lines = list( h1.cmdIter( 'seq 1 20000', lines=True ) )
+        self.assertEqual( lines, [ str( i ) for i in range( 1, 20001 ) ] )
+        for line in h1.cmdIter( 'yes', lines=True ):
+            self.assertEqual( line, 'y' )
+            break
+        self.assertEqual( h1.cmd( 'echo again' ).strip(), 'again' )
+
+
+class testNodeCmdsNoPty( testNodeCmds ):
+    "Test command execution on a single host without a pty."
+
+    hostClass = partial( Host, usePty=False )
+
+    def testSendInt( self ):
+        "sendInt() should interrupt the running command"
+        h1 = self.net.hosts[ 0 ]
+        h1.sendCmd( 'sleep 100' )
+        h1.sendInt()
+        h1.waitOutput()
+        self.assertEqual( h1.lastStatus, 130 )
+
+
+class testExecAgent( testCmdsCommon, unittest.TestCase ):
+    "Test spawning processes via a host's exec agent."
+
+    N = 1
+    hostClass = partial( Host, useAgent=True )
+
+    def testPexec( self ):
+        "Processes should run in the host's namespace"
+        h1 = self.net.hosts[ 0 ]
+        out, err, code = h1.pexec( 'readlink /proc/self/ns/net' )
+        self.assertEqual( out, h1.cmd( 'readlink /proc/self/ns/net' ).strip() +
+                          '\n' )
+        self.assertEqual( ( err, code ), ( '', 0 ) )
+        self.assertTrue( h1.agent )
+        _out, err, code = h1.pexec( 'ls /nonexistent' )
+        self.assertTrue( err )
+        self.assertNotEqual( code, 0 )
+
+    def testPopen( self ):
+        "Popen objects should track processes spawned by the agent"
+        h1 = self.net.hosts[ 0 ]
+        popen = h1.popen( 'sleep 100' )
+        self.assertEqual( popen.poll(), None )
+        popen.terminate()
+        self.assertEqual( popen.wait(), -15 )
+
+
+class testCmdAll( testCmdsCommon, unittest.TestCase ):
+    "Test concurrent command execution across many hosts."
+
+    def testCmdAll( self ):
+        "Each host should report its own shell PID"
+        outputs = self.net.cmdAll( None, 'echo $$' )
+        self.assertEqual( len( outputs ), self.N )
+        for host, out in outputs.items():
+            self.assertEqual( int( out.strip() ), host.pid )
+
+    def testCmdMap( self ):
+        "Each host should run its own command"
+        outputs = self.net.cmdMap( { 'h1': 'echo one', 'h2': 'echo two' } )
+        h1, h2 = self.net.get( 'h1', 'h2' )
+        self.assertEqual( outputs[ h1 ].strip(), 'one' )
+        self.assertEqual( outputs[ h2 ].strip(), 'two' )
+        # Shells should be ready for more commands afterwards
+        self.assertEqual( h1.cmd( 'echo again' ).strip(), 'again' )
+
+    def testWaitShells( self ):
+        "Shells started without waiting should all be usable"
+        h1 = self.net.addHost( 'h%d' % ( self.N + 1 ), waitShell=False )
+        self.assertTrue( h1.starting )
+        self.net.waitShells()
+        self.assertFalse( h1.starting )
+        outputs = self.net.cmdAll( None, 'echo $$' )
+        for host, out in outputs.items():
+            self.assertEqual( int( out.strip() ), host.pid )
+
+
+class testLightweightHost( testCmdsCommon, unittest.TestCase ):
+    "Test command execution on hosts without shells."
+
+    N = 2
+    hostClass = LightweightHost
+
+    def testCmd( self ):
+        "Commands should run in the host's namespace"
+        h1, h2 = self.net.hosts
+        self.net.addLink( h1, h2 )
+        out = h1.cmd( 'ip link show' )
+        self.assertTrue( 'h1-eth0' in out )
+        self.assertFalse( 'h2-eth0' in out )
+        result = h1.cmd( 'echo one; false', result=True )
+        self.assertEqual( result.output, 'one\n' )
+        self.assertEqual( result.status, 1 )
+
+    def testBackground( self ):
+        "Background commands should return immediately"
+        h1 = self.net.hosts[ 0 ]
+        self.assertEqual( h1.cmd( 'sleep 10 &' ), '' )
+        self.assertTrue( h1.lastPid > 0 )
+        outputs = self.net.cmdAll( None, 'echo $$' )
+        self.assertEqual( len( outputs ), self.N )
+
+
+@unittest.skipUnless( asyncio, 'asyncio (or trollius) is not installed' )
+class testAsyncCmds( testCmdsCommon, unittest.TestCase ):
+    "Test asyncio command execution across many hosts."
+
+    def testAcmd( self ):
+        "Each host should report its own shell PID"
+        loop = asyncio.get_event_loop()
+        hosts = self.net.hosts
+        outputs = loop.run_until_complete(
+            asyncio.gather( *[ h.acmd( 'echo $$' ) for h in hosts ] ) )
+        for host, out in zip( hosts, outputs ):
+            self.assertEqual( int( out.strip() ), host.pid )
+
+    def testApopen( self ):
+        "Process should run in the host's namespace"
+        loop = asyncio.get_event_loop()
+        h1 = self.net.hosts[ 0 ]
+        popen = loop.run_until_complete(
+            h1.apopen( 'ip link show' ) )
+        out, _err = loop.run_until_complete( popen.communicate() )
+        self.assertTrue( 'lo' in out )
+        self.assertFalse( 'eth0' in out )
+
+
+class ShellNode( BaseNode ):
+    """Node whose shell is plain bash in our own namespace, so that
+       BaseNode's command support can be tested without root or mnexec"""
+
+    isSetup = True
+
+    def getShell( self, master, slave, mnopts=None ):
+        "Start bash with our prompt, and without line editing"
+        return Popen( [ 'env', 'PS1=' + self.prompt, 'bash', '--norc',
+                        '--noediting', '-is', 'mininet:' + self.name ],
+                      stdin=slave, stdout=slave, stderr=slave,
+                      close_fds=False, preexec_fn=self.detach )
+
+    @staticmethod
+    def detach():
+        "Make our pty the controlling tty of a new session, like mnexec -d"
+        os.setsid()
+        ioctl( 0, TIOCSCTTY, 0 )
+
+    def sendCmd( self, *args, **kwargs ):
+        "Send a command without mnexec -p"
+        kwargs[ 'printPid' ] = False
+        return BaseNode.sendCmd( self, *args, **kwargs )
+
+    def terminate( self ):
+        "Stop our shell"
+        if self.shell and self.shell.poll() is None:
+            self.shell.kill()
+            self.shell.wait()
+        self.cleanup()
+
+
+class testBaseNodeCmds( unittest.TestCase ):
+    "Test BaseNode command support with a plain bash shell."
+
+    def setUp( self ):
+        "Start a shell node"
+        self.node = ShellNode( 's1', inNamespace=False )
+
+    def tearDown( self ):
+        "Stop our shell node"
+        self.node.terminate()
+
+    def testCmdIter( self ):
+        "cmdIter() should interrupt its command if abandoned"
+        node = self.node
+        lines = list( node.cmdIter( 'seq 1 3', lines=True ) )
+        self.assertEqual( lines, [ '1', '2', '3' ] )
+        for line in node.cmdIter( 'yes', lines=True ):
+            self.assertEqual( line, 'y' )
+            break
+        self.assertFalse( node.waiting )
+        self.assertEqual( node.cmd( 'echo again' ).strip(), 'again' )
+
+    @unittest.skipUnless( asyncio, 'asyncio (or trollius) is not installed' )
+    def testAcmd( self ):
+        "acmd() should return a command's output and status"
+        node = self.node
+        loop = asyncio.get_event_loop()
+        out = loop.run_until_complete( node.acmd( 'echo one; (exit 2)' ) )
+        self.assertEqual( out.strip(), 'one' )
+        self.assertEqual( node.lastStatus, 2 )
+        self.assertEqual( node.cmd( 'echo again' ).strip(), 'again' )
+
+    @unittest.skipUnless( asyncio, 'asyncio (or trollius) is not installed' )
+    def testAcmdBuffered( self ):
+        "acmd() should use output that is already in our read buffer"
+        node = self.node
+        loop = asyncio.get_event_loop()
+        # As if read ahead by readline(): the whole response to our
+        # command, which will never make the shell's fd readable
+        node.readbuf += 'buffered\n' + chr( 2 ) + '0' + chr( 127 )
+        future = node.acmd( 'true' )
+        self.assertTrue( future.done() )
+        self.assertEqual( loop.run_until_complete( future ), 'buffered\n' )
+        # Discard the shell's real response
+        node.waiting = True
+        node.waitOutput()
+        self.assertEqual( node.cmd( 'echo again' ).strip(), 'again' )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test link creation and configuration."""
+
+import unittest
+import sys
+from errno import EEXIST
+from functools import partial
+
+from mininet.net import Mininet
+from mininet.topo import Topo
+from mininet.node import Host
+from mininet.link import Link, OVSLink, TCLink, TCIntf, LinkSchedule
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.util import quietRun
+from mininet.linux.util import coreList, cpuMask
+
+
+class ChainTopo( Topo ):
+    "Chain of hosts, with no switches"
+
+    def build( self, n=3, **linkopts ):
+        hosts = [ self.addHost( 'h%d' % i ) for i in range( 1, n + 1 ) ]
+        for h1, h2 in zip( hosts, hosts[ 1: ] ):
+            self.addLink( h1, h2, **linkopts )
+
+
+# Tell pylint not to complain about calls to other class
+# pylint: disable=E1101
+
+class testLinksCommon( object ):
+    """Switchless networks for link tests (common code): a mixin
+       for unittest.TestCase subclasses, which provide assertTrue() etc."""
+
+    def setUp( self ):
+        "No network yet; tests create one with build()"
+        self.net = None
+
+    def tearDown( self ):
+        "Clean up if necessary"
+        if self.net:
+            self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def build( self, topo, **params ):
+        "Build and return a network"
+        self.net = Mininet( topo, controller=None, **params )
+        return self.net
+
+    def assertIntfs( self, net ):
+        "Check that each interface exists in its node with its MAC"
+        for host in net.hosts:
+            for intf in host.intfList():
+                if intf.name == 'lo':
+                    continue
+                out = host.cmd( 'ip -o link show', intf.name )
+                self.assertTrue( intf.name + '@' in out )
+                self.assertTrue( intf.MAC() in out )
+
+
+class testBatchLinks( testLinksCommon, unittest.TestCase ):
+    "Test batched creation of links' interfaces."
+
+    def testBatch( self ):
+        "Interfaces should be created in the right namespaces"
+        net = self.build( ChainTopo( n=4 ), batchLinks=True )
+        self.assertTrue( Link.canBatch() )
+        self.assertEqual( len( net.links ), 3 )
+        self.assertIntfs( net )
+
+    def testBatchTC( self ):
+        "TCLinks' interfaces should be batched too"
+        self.assertTrue( TCLink.canBatch() )
+        net = self.build( ChainTopo( n=3 ), link=TCLink, batchLinks=True )
+        self.assertIntfs( net )
+
+    def testUnbatchable( self ):
+        "Links which can't be batched should be created one by one"
+        self.assertFalse( OVSLink.canBatch() )
+        net = self.build( ChainTopo( n=3 ), link=OVSLink, batchLinks=True )
+        self.assertIntfs( net )
+
+    def testNoBatch( self ):
+        "Interfaces should be created one by one on request"
+        net = self.build( ChainTopo( n=3 ), batchLinks=False )
+        self.assertIntfs( net )
+
+
+class testTCBatch( testLinksCommon, unittest.TestCase ):
+    "Test configuring TCIntfs with tc -batch."
+
+    def testBatch( self ):
+        "Each interface should be shaped as requested"
+        net = self.build( ChainTopo( n=3, bw=10 ), link=TCLink,
+                          batchLinks=True )
+        for node in net.hosts + net.switches:
+            self.assertEqual( node.tcDeferral, None )
+        for host in net.hosts:
+            for intf in host.intfList():
+                if intf.name == 'lo':
+                    continue
+                out = host.cmd( 'tc class show dev', intf )
+                self.assertTrue( 'rate 10Mbit' in out )
+
+    def testErrors( self ):
+        "Errors should be reported for the interface that caused them"
+        net = self.build( ChainTopo( n=3 ), link=TCLink, batchLinks=True )
+        intf1, intf2 = net.links[ 0 ].intf1, net.links[ 1 ].intf2
+        deferral = TCIntf.deferConfig( net.hosts + net.switches )
+        intf1.config( bw=10 )
+        deferral[ 'cmds' ][ intf2 ] = [ '%s qdisc add dev %s root bogus' ]
+        errors = TCIntf.batchConfig( deferral )
+        self.assertEqual( errors.keys(), [ intf2 ] )
+        out = intf1.node.cmd( 'tc class show dev', intf1 )
+        self.assertTrue( 'rate 10Mbit' in out )
+
+
+class testOffloads( testLinksCommon, unittest.TestCase ):
+    "Test setting offloads without running ethtool."
+
+    def features( self, intf ):
+        "Return ethtool -k output for intf"
+        return intf.node.cmd( 'ethtool -k', intf )
+
+    def testOffloads( self ):
+        """Offloads should be set in batches and one by one, with
+           ethtool or (with useNetlink) the ioctl"""
+        for useNetlink in False, True:
+            net = self.build( ChainTopo( n=3, gro=True, txo=False ),
+                              link=TCLink,
+                              host=partial( Host, useNetlink=useNetlink ) )
+            for link in net.links:
+                for intf in link.intf1, link.intf2:
+                    self.assertEqual( intf.ioctlOffloads(), useNetlink )
+                    out = self.features( intf )
+                    self.assertTrue( 'generic-receive-offload: on' in out )
+                    self.assertTrue( 'tx-checksumming: off' in out )
+            intf = net.links[ 0 ].intf1
+            self.assertEqual( intf.setOffloads( gro=False ), '' )
+            out = self.features( intf )
+            self.assertTrue( 'generic-receive-offload: off' in out )
+            net.hosts[ 0 ].cmd( 'ip link del', intf )
+            self.assertTrue( intf.setOffloads( gro=True ) )
+            net.stop()
+            self.net = None
+
+
+class testTCUpdate( testLinksCommon, unittest.TestCase ):
+    "Test changing TCIntf parameters at runtime."
+
+    def testUpdate( self ):
+        "Only the affected classes and qdiscs should change"
+        net = self.build( ChainTopo( n=2, bw=10 ), link=TCLink )
+        intf = net.links[ 0 ].intf1
+
+        def tc( what ):
+            "Return tc's listing of what (class or qdisc) for intf"
+            return intf.node.cmd( 'tc', what, 'show dev', intf )
+
+        outputs = intf.update( bw=5 )
+        # Only the htb class changes
+        self.assertEqual( len( outputs ), 1 )
+        self.assertTrue( 'rate 5Mbit' in tc( 'class' ) )
+        self.assertTrue( 'qdisc htb 5:' in tc( 'qdisc' ) )
+        self.assertEqual( intf.params[ 'bw' ], 5 )
+        # Changing the kind of qdisc rebuilds our configuration
+        intf.update( use_tbf=True )
+        self.assertTrue( 'qdisc tbf 5:' in tc( 'qdisc' ) )
+        # Removing all parameters removes our qdiscs
+        intf.update( bw=None )
+        self.assertFalse( 'tbf' in tc( 'qdisc' ) )
+
+
+class testHighRate( testLinksCommon, unittest.TestCase ):
+    "Test shaping links faster than 1 Gb/s."
+
+    def testSizes( self ):
+        "Burst and quantum should cover a tick and a GSO packet"
+        sizes = TCIntf.highRateParams( 10000 )
+        self.assertEqual( sizes[ 'burst' ], 10000 * 125000 / TCIntf.HZ )
+        self.assertEqual( sizes[ 'cburst' ], sizes[ 'burst' ] )
+        self.assertTrue( sizes[ 'quantum' ] > TCIntf.gsoMaxSize )
+        self.assertTrue( sizes[ 'quantum' ] <= 200000 )
+        sizes = TCIntf.highRateParams( 100, mtu=9000 )
+        self.assertEqual( sizes[ 'burst' ], TCIntf.gsoMaxSize + 9000 )
+        # Quantum follows the rate between those limits
+        self.assertEqual( TCIntf.highRateParams( 300 )[ 'quantum' ],
+                          300 * 125000 / TCIntf.HZ )
+
+    def testLink( self ):
+        "Links above 1 Gb/s should be shaped at the requested rate"
+        net = self.build( ChainTopo( n=2, bw=40000 ), link=TCLink )
+        intf = net.links[ 0 ].intf1
+        out = intf.node.cmd( 'tc class show dev', intf )
+        self.assertTrue( 'rate 40Gbit' in out )
+        # Changing the rate should only change the class
+        cmds = TCIntf.changeCmds( intf.tcCmds( bw=2000 )[ 0 ],
+                                  intf.tcCmds( bw=5000 )[ 0 ] )
+        self.assertTrue( cmds )
+        self.assertTrue( all( ' class change ' in cmd for cmd in cmds ) )
+        intf.update( bw=5000 )
+        out = intf.node.cmd( 'tc class show dev', intf )
+        self.assertTrue( 'rate 5Gbit' in out )
+
+
+class testLinkSchedule( testLinksCommon, unittest.TestCase ):
+    "Test replaying traces onto links."
+
+    def testReplay( self ):
+        "Each step of the trace should be applied in order"
+        net = self.build( ChainTopo( n=2, bw=10, delay='1ms' ),
+                          link=TCLink )
+        intf = net.links[ 0 ].intf1
+        schedule = LinkSchedule()
+        schedule.add( intf, [ ( 0, { 'bw': 8 } ),
+                              ( .01, { 'bw': 5, 'delay': '20ms' } ) ] )
+        schedule.start()
+        schedule.wait()
+        self.assertEqual( intf.params[ 'bw' ], 5 )
+        out = intf.node.cmd( 'tc class show dev', intf )
+        self.assertTrue( 'rate 5Mbit' in out )
+        out = intf.node.cmd( 'tc qdisc show dev', intf )
+        self.assertTrue( 'delay 20' in out )
+
+    def testStructure( self ):
+        "Traces which would add qdiscs should be rejected"
+        net = self.build( ChainTopo( n=2, bw=10 ), link=TCLink )
+        schedule = LinkSchedule()
+        self.assertRaises( Exception, schedule.add, net.links[ 0 ].intf1,
+                           [ ( 0, { 'delay': '5ms' } ) ] )
+        self.assertEqual( schedule.timeline, [] )
+
+
+class testMultiQueue( testLinksCommon, unittest.TestCase ):
+    "Test multi-queue links and steering their queues to cores."
+
+    def testQueues( self ):
+        "Both ends should have the requested queues"
+        for useNetlink in False, True:
+            net = self.build( ChainTopo( n=2, numtxqueues=4,
+                                         numrxqueues=2 ),
+                              host=partial( Host, useNetlink=useNetlink ) )
+            for intf in net.links[ 0 ].intf1, net.links[ 0 ].intf2:
+                queues = intf.node.cmd( 'ls /sys/class/net/%s/queues' %
+                                        intf ).split()
+                self.assertEqual( sorted( queues ),
+                                  [ 'rx-0', 'rx-1', 'tx-0', 'tx-1',
+                                    'tx-2', 'tx-3' ] )
+            net.stop()
+            self.net = None
+
+    def testSteering( self ):
+        "Queues should be steered to the given cores"
+        net = self.build( ChainTopo( n=2, numtxqueues=2 ) )
+        intf = net.links[ 0 ].intf1
+        intf.setCPUs( '0' )
+        path = '/sys/class/net/%s/queues' % intf
+        for queue in 'rx-0/rps_cpus', 'tx-0/xps_cpus', 'tx-1/xps_cpus':
+            mask = intf.node.cmd( 'cat %s/%s' % ( path, queue ) )
+            self.assertEqual( int( mask.replace( ',', '' ), 16 ), 1 )
+
+    def testMasks( self ):
+        "Core lists should convert to sysfs CPU masks"
+        self.assertEqual( coreList( '0-2,4' ), [ 0, 1, 2, 4 ] )
+        self.assertEqual( coreList( 3 ), [ 3 ] )
+        self.assertEqual( cpuMask( [ 0, 2 ] ), '00000005' )
+        self.assertEqual( cpuMask( [ 0, 33 ] ), '00000002,00000001' )
+
+
+class testIntfState( testLinksCommon, unittest.TestCase ):
+    "Test reading interface state from one dump per namespace."
+
+    def testState( self ):
+        "Cached state should follow changes to interfaces"
+        for useNetlink in False, True:
+            net = self.build( ChainTopo( n=2 ), batchLinks=False,
+                              host=partial( Host, useNetlink=useNetlink ) )
+            h1 = net.hosts[ 0 ]
+            intf = h1.intf()
+            state = h1.intfState()
+            self.assertEqual( sorted( state ), [ 'h1-eth0', 'lo' ] )
+            self.assertTrue( h1.intfState() is state )
+            self.assertEqual( intf.updateMAC(), intf.MAC() )
+            self.assertTrue( intf.isUp() )
+            # Our own changes clear the cache
+            intf.setIP( '10.0.0.9/8' )
+            self.assertEqual( intf.updateIP(), '10.0.0.9' )
+            # So do commands, which may change anything
+            h1.cmd( 'ip link set dev', intf, 'down' )
+            self.assertFalse( intf.isUp() )
+            # and processes started with popen() or pexec()
+            h1.pexec( 'ip link set dev %s up' % intf )
+            self.assertTrue( intf.isUp() )
+            # and commands run in the root namespace
+            state = h1.intfState()
+            quietRun( 'true' )
+            self.assertFalse( h1.intfState() is state )
+            h1.cmd( 'ip link del dev', intf )
+            self.assertEqual( intf.status(), 'MISSING' )
+            net.stop()
+            self.net = None
+
+
+class testNetlink( testLinksCommon, unittest.TestCase ):
+    "Test managing interfaces via rtnetlink."
+
+    def testLinks( self ):
+        "Links should be created and configured without ip or ifconfig"
+        net = self.build( ChainTopo( n=3 ), batchLinks=False,
+                          host=partial( Host, useNetlink=True ) )
+        self.assertIntfs( net )
+        h1, h2, _h3 = net.hosts
+        intf = h1.intf()
+        self.assertTrue( intf.isUp() )
+        intf.config( ip='10.0.0.1/8', mac='00:00:00:00:00:11', mtu=1400 )
+        out = h1.cmd( 'ip -o addr show', intf )
+        self.assertTrue( 'inet 10.0.0.1/8' in out )
+        out = h1.cmd( 'ip -o link show', intf )
+        self.assertTrue( '00:00:00:00:00:11' in out )
+        self.assertTrue( 'mtu 1400' in out )
+        # Errors are reported by errno
+        try:
+            net.addLink( h1, h2, intfName1=intf.name )
+            self.fail( 'duplicate interface was created' )
+        except OSError as e:
+            self.assertEqual( e.errno, EEXIST )
+        self.assertEqual( net.links[ 0 ].status(), '(OK OK)' )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -4,8 +4,11 @@
    Test creation and all-pairs ping for each included mininet topo type."""
 
 import unittest
+import os
 import sys
 from functools import partial
+from subprocess import Popen
+from time import time
 
 from mininet.net import Mininet
 from mininet.node import Host, Controller
@@ -14,6 +17,7 @@
 from mininet.log import setLogLevel
 from mininet.util import quietRun
 from mininet.clean import cleanup
+from mininet.linux.util import killShells, waitReaped
 
 # Tell pylint not to complain about calls to other class
 # pylint: disable=E1101
@@ -103,6 +107,68 @@ class testLinearUserspace( testLinearCommon, unittest.TestCase ):
     switchClass = UserSwitch
 
 
+class testFastStop( unittest.TestCase ):
+    "Test stopping a network by destroying its namespaces."
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testFastStop( self ):
+        "Nodes and interfaces should all go away"
+        mn = Mininet( LinearTopo( k=3 ), OVSSwitch, Host, Controller,
+                      waitConnected=True, fastStop=True )
+        dropped = mn.run( mn.ping )
+        self.assertEqual( dropped, 0 )
+        intfs = quietRun( 'ip -o link show' )
+        for switch in mn.switches:
+            self.assertFalse( switch.name + '-eth' in intfs )
+        for node in mn.hosts + mn.switches:
+            self.assertEqual( node.shell, None )
+
+    def testWaitReaped( self ):
+        "Shells which ignore SIGHUP should be killed in bounded time"
+        shells = [ Popen( [ 'sh', '-c', 'trap "" HUP; sleep 100' ],
+                          preexec_fn=os.setsid ) for _ in range( 3 ) ]
+        start = time()
+        killShells( shells )
+        waitReaped( shells, [], timeout=.2, killTimeout=1 )
+        self.assertTrue( time() - start < 1.2 )
+        for shell in shells:
+            self.assertNotEqual( shell.poll(), None )
+
+
+class testStreamLinks( unittest.TestCase ):
+    "Test adding topo links in chunks, in topo order."
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testChunks( self ):
+        "linkChunks() should copy and split links"
+        links = LinearTopo( k=3 ).links( withInfo=True )
+        chunks = list( Mininet.linkChunks( links, 2 ) )
+        self.assertEqual( [ len( chunk ) for chunk in chunks ], [ 2, 2, 1 ] )
+        self.assertEqual( sum( chunks, [] ), links )
+        self.assertFalse( chunks[ 0 ][ 0 ][ 2 ] is links[ 0 ][ 2 ] )
+        self.assertEqual( list( Mininet.linkChunks( links ) ), [ links ] )
+
+    def testStreamLinks( self ):
+        "Streamed links should work like sorted ones"
+        mn = Mininet( LinearTopo( k=4 ), OVSSwitch, Host, Controller,
+                      waitConnected=True, streamLinks=True, build=False )
+        mn.linkChunk = 2
+        mn.build()
+        self.assertEqual( len( mn.links ), 7 )
+        dropped = mn.run( mn.ping )
+        self.assertEqual( dropped, 0 )
+
+
 if __name__ == '__main__':
     setLogLevel( 'warning' )
     unittest.main()
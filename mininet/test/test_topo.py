@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test topology representation."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.topo import ( Topo, LinearTopo, MultiGraph, CompactGraph,
+                           cachedTopo )
+from mininet.topolib import ( FatTreeTopo, ClosTopo, DragonflyTopo,
+                              JellyfishTopo )
+from mininet.log import setLogLevel
+
+
+class testCompactGraph( unittest.TestCase ):
+    "Test that CompactGraph behaves like MultiGraph in a Topo."
+
+    @staticmethod
+    def topos( **params ):
+        "Return the same topology with each graph class"
+        return [ LinearTopo( k=10, n=2, graph=graph, lopts={ 'bw': 10 },
+                             **params )
+                 for graph in MultiGraph, CompactGraph ]
+
+    def testQueries( self ):
+        "Nodes, links, ports and info should match"
+        multi, compact = self.topos()
+        self.assertEqual( compact.hosts(), multi.hosts() )
+        self.assertEqual( compact.switches(), multi.switches() )
+        self.assertEqual( compact.links( sort=True, withKeys=True,
+                                         withInfo=True ),
+                          multi.links( sort=True, withKeys=True,
+                                       withInfo=True ) )
+        self.assertEqual( compact.port( 's2', 's1' ),
+                          multi.port( 's2', 's1' ) )
+        self.assertEqual( compact.linkInfo( 's1', 's2' ),
+                          multi.linkInfo( 's1', 's2' ) )
+        self.assertEqual( compact.nodeInfo( 's3' ), { 'isSwitch': True } )
+        self.assertEqual( sorted( compact.g[ 's2' ] ),
+                          sorted( multi.g[ 's2' ] ) )
+
+    def testChanges( self ):
+        "Info changes and parallel links should work"
+        for topo in self.topos():
+            info = dict( topo.linkInfo( 's1', 's2' ), bw=5 )
+            topo.setlinkInfo( 's1', 's2', info )
+            self.assertEqual( topo.linkInfo( 's2', 's1' ), info )
+            topo.addLink( 's1', 's2' )
+            self.assertEqual( sorted( topo.g[ 's1' ][ 's2' ] ), [ 1, 2 ] )
+            topo.setNodeInfo( 'h1s1', { 'ip': '10.0.0.99' } )
+            self.assertEqual( topo.nodeInfo( 'h1s1' )[ 'ip' ],
+                              '10.0.0.99' )
+
+    def testSharing( self ):
+        "Equal attribute dicts should be stored once"
+        _multi, compact = self.topos()
+        infos = compact.g.edgeAttrs
+        self.assertTrue( all( info is infos[ 0 ] for info in infos ) )
+
+
+class testTopoIndexes( unittest.TestCase ):
+    "Test Topo's port, key and node list indexes."
+
+    def testPorts( self ):
+        "port() should track added and replaced links"
+        for graph in MultiGraph, CompactGraph:
+            topo = Topo( graph=graph )
+            topo.addSwitch( 's1' )
+            topo.addSwitch( 's2' )
+            topo.addLink( 's1', 's2' )
+            self.assertEqual( topo.port( 's1', 's2' ), ( 1, 1 ) )
+            self.assertEqual( topo.port( 's2', 's1' ), ( 1, 1 ) )
+            topo.addLink( 's1', 's2', port1=5 )
+            self.assertEqual( topo.port( 's1', 's2' ), [ ( 1, 1 ), ( 5, 2 ) ] )
+            self.assertEqual( sorted( topo.g[ 's1' ][ 's2' ] ), [ 1, 2 ] )
+            # Reusing port 5 of s1 replaces its old link there,
+            # but (as ever) s2 still lists its old port
+            topo.addHost( 'h1' )
+            topo.addLink( 's1', 'h1', port1=5 )
+            self.assertEqual( topo.port( 's1', 's2' ), ( 1, 1 ) )
+            self.assertEqual( topo.port( 's2', 's1' ), [ ( 1, 1 ), ( 2, 5 ) ] )
+            self.assertEqual( topo.port( 's1', 'h1' ), ( 5, 0 ) )
+            self.assertEqual( topo.port( 's1', 's3' ), [] )
+            topo.addLink( 's1', 's2', port1=1, port2=1 )
+            self.assertEqual( topo.port( 's2', 's1' ), [ ( 1, 1 ), ( 2, 5 ) ] )
+            topo.addLink( 's1', 's2', key=7 )
+            topo.addLink( 's2', 's1' )
+            self.assertEqual( sorted( topo.g[ 's1' ][ 's2' ] ),
+                              [ 1, 2, 3, 7, 8 ] )
+
+    def testPortReuse( self ):
+        "New ports should not clash with ones in use"
+        for graph in MultiGraph, CompactGraph:
+            topo = Topo( graph=graph )
+            for sw in 's1', 's2', 's3':
+                topo.addSwitch( sw )
+            topo.addLink( 's1', 's2' )
+            topo.addLink( 's3', 's2' )
+            topo.addLink( 's1', 's3', port1=1 )
+            topo.addLink( 's1', 's2' )
+            self.assertEqual( topo.port( 's3', 's2' ), ( 1, 2 ) )
+            self.assertEqual( topo.port( 's2', 's3' ), ( 2, 1 ) )
+            self.assertEqual( topo.port( 's1', 's3' ), ( 1, 2 ) )
+            self.assertEqual( topo.ports[ 's2' ],
+                              { 1: ( 's1', 1 ), 2: ( 's3', 1 ),
+                                3: ( 's1', 2 ) } )
+
+    def testNodeLists( self ):
+        "hosts() and switches() should reflect node changes"
+        for graph in MultiGraph, CompactGraph:
+            topo = Topo( graph=graph )
+            topo.addSwitch( 's10' )
+            topo.addHost( 'h2' )
+            self.assertEqual( topo.switches(), [ 's10' ] )
+            self.assertEqual( topo.hosts(), [ 'h2' ] )
+            topo.addSwitch( 's9' )
+            topo.addHost( 'h1' )
+            self.assertEqual( topo.switches(), [ 's9', 's10' ] )
+            self.assertEqual( topo.hosts(), [ 'h1', 'h2' ] )
+            self.assertEqual( topo.nodes(), [ 'h1', 'h2', 's9', 's10' ] )
+            # Callers may modify the lists they get back
+            topo.hosts().append( 'h3' )
+            self.assertEqual( topo.hosts(), [ 'h1', 'h2' ] )
+            topo.setNodeInfo( 'h2', { 'isSwitch': True } )
+            self.assertEqual( topo.hosts(), [ 'h1' ] )
+            self.assertEqual( topo.switches(), [ 'h2', 's9', 's10' ] )
+
+
+class testFabrics( unittest.TestCase ):
+    "Test generated datacenter fabrics."
+
+    def checkFabric( self, topo, switches, hosts, links, degree ):
+        "Check sizes, switch degrees and port assignment"
+        self.assertEqual( len( topo.switches() ), switches )
+        self.assertEqual( len( topo.hosts() ), hosts )
+        self.assertEqual( len( topo.links() ), links )
+        for sw in topo.switches():
+            ports = sorted( topo.ports[ sw ] )
+            self.assertEqual( ports, range( 1, degree + 1 ) )
+        for src, dst, info in topo.links( withInfo=True ):
+            self.assertEqual( topo.ports[ src ][ info[ 'port1' ] ],
+                              ( dst, info[ 'port2' ] ) )
+        for h in topo.hosts():
+            self.assertEqual( topo.ports[ h ].keys(), [ 0 ] )
+
+    def testFatTree( self ):
+        "k-ary fat tree should have k^3/4 hosts"
+        self.checkFabric( FatTreeTopo( k=4 ), 20, 16, 48, 4 )
+        self.assertEqual( FatTreeTopo( k=4 ).port( 's5', 's1' ), ( 3, 1 ) )
+
+    def testClos( self ):
+        "Every leaf should connect to every spine"
+        topo = ClosTopo( spines=2, leaves=3, n=2, links=2 )
+        self.checkFabric( topo, 5, 6, 18, 6 )
+        self.assertEqual( topo.port( 's4', 's2' ), [ ( 5, 3 ), ( 6, 4 ) ] )
+
+    def testDragonfly( self ):
+        "Groups should be fully connected, with one link per pair"
+        topo = DragonflyTopo( a=2, p=1, h=1 )
+        self.checkFabric( topo, 6, 6, 6 + 3 + 3, 3 )
+        groups = set( ( int( sw[ 1: ] ) - 1 ) // 2
+                      for sw in topo.switches() )
+        self.assertEqual( groups, set( [ 0, 1, 2 ] ) )
+
+    def testJellyfish( self ):
+        "Jellyfish should be regular and repeatable"
+        topo = JellyfishTopo( switches=20, degree=4, n=1, seed=3 )
+        self.checkFabric( topo, 20, 20, 20 + 40, 5 )
+        self.assertEqual( topo.links(),
+                          JellyfishTopo( switches=20, degree=4, n=1,
+                                         seed=3 ).links() )
+        # A complete graph needs splicing to finish
+        self.checkFabric( JellyfishTopo( switches=5, degree=4, n=0 ),
+                          5, 0, 10, 4 )
+
+    def testAddLinks( self ):
+        "addLinks() should match addLink() with the same ports"
+        links = [ ( 'h1', 's1', 0, 1 ), ( 's1', 's2', 2, 1 ),
+                  ( 's1', 's2', 3, 2 ) ]
+        for graph in MultiGraph, CompactGraph:
+            slow, fast = Topo( graph=graph ), Topo( graph=graph )
+            for topo in slow, fast:
+                topo.addHost( 'h1' )
+                topo.addSwitch( 's1' )
+                topo.addSwitch( 's2' )
+            for node1, node2, port1, port2 in links:
+                slow.addLink( node1, node2, port1, port2, bw=1 )
+            fast.addLinks( links, bw=1 )
+            self.assertEqual( slow.links( withKeys=True, withInfo=True ),
+                              fast.links( withKeys=True, withInfo=True ) )
+            self.assertEqual( slow.ports, fast.ports )
+            self.assertEqual( fast.port( 's2', 's1' ), [ ( 1, 2 ), ( 2, 3 ) ] )
+
+
+class testSnapshot( unittest.TestCase ):
+    "Test saving, loading and caching topologies."
+
+    def setUp( self ):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.dir )
+
+    def assertSameTopo( self, topo1, topo2 ):
+        "Check that two topologies have the same nodes and links"
+        self.assertIsInstance( topo2, topo1.__class__ )
+        self.assertIsInstance( topo1, topo2.__class__ )
+        self.assertIsInstance( topo2.g, topo1.g.__class__ )
+        self.assertIsInstance( topo1.g, topo2.g.__class__ )
+        self.assertEqual( topo1.nodes(), topo2.nodes() )
+        for node in topo1.nodes():
+            self.assertEqual( topo1.nodeInfo( node ), topo2.nodeInfo( node ) )
+        self.assertEqual( topo1.links( True, True, True ),
+                          topo2.links( True, True, True ) )
+        self.assertEqual( topo1.ports, topo2.ports )
+        self.assertEqual( topo1.lopts, topo2.lopts )
+
+    def testSaveLoad( self ):
+        "Loaded topologies should match saved ones"
+        for name in 'topo.json', 'topo.json.gz':
+            path = os.path.join( self.dir, name )
+            for topo in testCompactGraph.topos() + [ FatTreeTopo( k=4 ) ]:
+                topo.addLink( 's1', 's2', key='backup', port1=99, delay='1ms' )
+                topo.save( path )
+                loaded = type( topo ).load( path )
+                self.assertSameTopo( topo, loaded )
+                self.assertEqual( loaded.linkInfo( 's1', 's2', 'backup' )[
+                    'delay' ], '1ms' )
+                self.assertIsInstance( loaded.hosts()[ 0 ], str )
+
+    def testCache( self ):
+        "cachedTopo() should build once and load afterwards"
+        built = []
+
+        class CountingTopo( LinearTopo ):
+            "LinearTopo which counts calls to build()"
+            def build( self, *args, **params ):
+                built.append( args )
+                LinearTopo.build( self, *args, **params )
+
+        topos = [ cachedTopo( self.dir, CountingTopo, k, n=2 )
+                  for k in 3, 3, 4 ]
+        self.assertEqual( built, [ ( 3, ), ( 4, ) ] )
+        self.assertSameTopo( topos[ 0 ], topos[ 1 ] )
+        self.assertEqual( len( topos[ 2 ].switches() ), 4 )
+        self.assertEqual( len( os.listdir( self.dir ) ), 2 )
+        # Topologies with unsaveable options are just built
+        topo = cachedTopo( self.dir, CountingTopo, 2, lopts={ 'cls': Topo } )
+        self.assertEqual( len( topo.links() ), 3 )
+        self.assertEqual( len( os.listdir( self.dir ) ), 2 )
+        # Options which JSON would change aren't saved either
+        dirs = [ ( '/var/log', '/tmp/%(name)s' ) ]
+        topo = cachedTopo( self.dir, CountingTopo, 2, hopts={
+            'privateDirs': dirs } )
+        self.assertEqual( topo.nodeInfo( 'h1' )[ 'privateDirs' ], dirs )
+        self.assertEqual( len( os.listdir( self.dir ) ), 2 )
+        self.assertRaises( TypeError, topo.save,
+                           os.path.join( self.dir, 'topo.json' ) )
+        topo = LinearTopo( lopts={ 'tc': { 1: 2 } } )
+        self.assertRaises( TypeError, topo.save,
+                           os.path.join( self.dir, 'topo.json' ) )
+        # Constructors from custom files (e.g. lambdas) are just built
+        topos = { 'mytopo': ( lambda: LinearTopo( k=2 ) ) }
+        for _ in range( 2 ):
+            topo = cachedTopo( self.dir, topos[ 'mytopo' ] )
+            self.assertEqual( len( topo.switches() ), 2 )
+        self.assertEqual( len( os.listdir( self.dir ) ), 2 )
+
+
+class testTopoGraph( unittest.TestCase ):
+    "Test selecting a Topo's graph class."
+
+    def testDefault( self ):
+        "Topos should use MultiGraph unless told otherwise"
+        self.assertIsInstance( Topo().g, MultiGraph )
+        self.assertNotIsInstance( Topo().g, CompactGraph )
+
+        class CompactTopo( Topo ):
+            "Topo which uses CompactGraph by default"
+            graph = CompactGraph
+
+        self.assertIsInstance( CompactTopo().g, CompactGraph )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
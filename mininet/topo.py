@@ -11,7 +11,15 @@
 setup for testing, and can even be emulated with the Mininet package.
 """
 
-from mininet.util import irange, natural, naturalSeq
+from array import array
+import gzip
+import hashlib
+import inspect
+import json
+import os
+
+from mininet.log import debug, warn
+from mininet.util import irange, natural
 
 class MultiGraph( object ):
     "Utility class to track nodes and edges - replaces networkx.MultiGraph"
@@ -19,6 +27,8 @@ class MultiGraph( object ):
     def __init__( self ):
         self.node = {}
         self.edge = {}
+        # Highest integer key for each ( src, dst ), with src <= dst
+        self.lastKey = {}
 
     def add_node( self, node, attr_dict=None, **attrs):
         """Add node to graph
@@ -44,9 +54,12 @@ def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
         self.edge[ src ].setdefault( dst, {} )
         entry = self.edge[ dst ][ src ] = self.edge[ src ][ dst ]
         # If no key, pick next ordinal number
+        pair = ( src, dst ) if src <= dst else ( dst, src )
+        lastKey = self.lastKey.get( pair, 0 )
         if key is None:
-            keys = [ k for k in entry.keys() if isinstance( k, int ) ]
-            key = max( [ 0 ] + keys ) + 1
+            key = lastKey + 1
+        if isinstance( key, int ) and key > lastKey:
+            self.lastKey[ pair ] = key
         entry[ key ] = attr_dict
         return key
 
@@ -55,6 +68,29 @@ def nodes( self, data=False):
            data: return list of ( node, attrs)"""
         return self.node.items() if data else self.node.keys()
 
+    @staticmethod
+    def canSplit( src, dst, attr_dict ):
+        """Can we keep an edge's endpoints and ports in our arrays?
+           Only if they are src, dst and non-negative integers"""
+        ends = attr_dict.get( 'node1' ), attr_dict.get( 'node2' )
+        if ends != ( src, dst ):
+            return False
+        for port in attr_dict.get( 'port1' ), attr_dict.get( 'port2' ):
+            # bool is an int, but not a port number
+            if ( not isinstance( port, int ) or
+                 isinstance( port, bool ) or port < 0 ):
+                return False
+        return True
+
+    def add_edges( self, edges, attr_dict=None ):
+        """Add many new edges with endpoints and ports (as added by Topo)
+           edges: iterable of ( src, dst, port1, port2 )
+           attr_dict: other attributes for every edge (optional)"""
+        for src, dst, port1, port2 in edges:
+            attrs = dict( attr_dict ) if attr_dict else {}
+            attrs.update( node1=src, node2=dst, port1=port1, port2=port2 )
+            self.add_edge( src, dst, attr_dict=attrs )
+
     def edges_iter( self, data=False, keys=False ):
         "Iterator: return graph edges"
         for src, entry in self.edge.iteritems():
@@ -86,6 +122,11 @@ def __len__( self ):
         "Return the number of nodes"
         return len( self.node )
 
+    @staticmethod
+    def sortKey( node ):
+        "Return natural sort key for node"
+        return natural( node )
+
     def convertTo( self, cls, data=False, keys=False ):
         """Convert to a new object of networkx.MultiGraph-like class cls
            data: include node and edge data
@@ -96,24 +137,285 @@ def convertTo( self, cls, data=False, keys=False ):
         return g
 
 
+class NodeView( object ):
+    "Dict-like view of a CompactGraph's node attributes, by node"
+
+    __slots__ = ( 'g', )
+
+    def __init__( self, g ):
+        self.g = g
+
+    def __getitem__( self, node ):
+        return self.g.attrs[ self.g.ids[ node ] ]
+
+    def __setitem__( self, node, attr_dict ):
+        if node in self.g.ids:
+            self.g.attrs[ self.g.ids[ node ] ] = attr_dict
+        else:
+            self.g.add_node( node, attr_dict )
+
+    def __contains__( self, node ):
+        return node in self.g.ids
+
+    def __iter__( self ):
+        return iter( self.g.names )
+
+    def __len__( self ):
+        return len( self.g.names )
+
+    def get( self, node, default=None ):
+        "Return attributes of node, or default"
+        return self[ node ] if node in self.g.ids else default
+
+    def keys( self ):
+        "Return list of nodes"
+        return list( self.g.names )
+
+    def items( self ):
+        "Return list of ( node, attrs )"
+        return zip( self.g.names, self.g.attrs )
+
+
+class CompactGraph( MultiGraph ):
+    """MultiGraph replacement for very large topologies: nodes have
+       integer ids, edges are stored in parallel arrays, equal
+       attribute dicts are shared, and each node's natural sort key
+       is computed only once. Link ports and endpoints (as added by Topo) are
+       kept in the arrays rather than in each edge's attribute dict.
+       Since attribute dicts may be shared or rebuilt on the fly,
+       change them with add_node() and add_edge() (or Topo's
+       setNodeInfo() and setlinkInfo()) rather than in place."""
+
+    # Per-edge attributes which we store in arrays
+    endpoints = ( 'node1', 'node2', 'port1', 'port2' )
+
+    # pylint: disable=super-init-not-called
+    def __init__( self ):
+        # Nodes, by id
+        self.names = []
+        self.attrs = []
+        self.keys = []
+        self.adj = []
+        self.ids = {}
+        self.node = NodeView( self )
+        # Edges, by id; port1 is -1 if we couldn't split
+        # out the edge's endpoints and ports
+        self.src, self.dst = array( 'i' ), array( 'i' )
+        self.port1, self.port2 = array( 'i' ), array( 'i' )
+        self.edgeKeys = []
+        self.edgeAttrs = []
+        # Edge ids, and highest integer key, for each pair of node ids
+        self.pairs = {}
+        self.lastKey = {}
+        # Interned attribute dicts
+        self.shared = {}
+        self.empty = {}
+
+    def share( self, attr_dict ):
+        "Return a shared dict equal to attr_dict, if we can"
+        if not attr_dict:
+            return self.empty
+        try:
+            return self.shared.setdefault( frozenset( attr_dict.iteritems() ),
+                                           attr_dict )
+        except TypeError:
+            # Unhashable values
+            return attr_dict
+
+    def nodeId( self, node, attr_dict=None ):
+        "Return id for node, adding it (with attr_dict) if necessary"
+        i = self.ids.get( node )
+        if i is None:
+            i = self.ids[ node ] = len( self.names )
+            self.names.append( node )
+            self.attrs.append( self.share( attr_dict ) )
+            self.keys.append( None )
+            self.adj.append( array( 'i' ) )
+        elif attr_dict is not None:
+            self.attrs[ i ] = self.share( attr_dict )
+        return i
+
+    def add_node( self, node, attr_dict=None, **attrs ):
+        """Add node to graph
+           attr_dict: attribute dict (optional)
+           attrs: more attributes (optional)
+           warning: updates attr_dict with attrs"""
+        attr_dict = {} if attr_dict is None else attr_dict
+        attr_dict.update( attrs )
+        self.nodeId( node, attr_dict )
+
+    def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
+        """Add edge to graph
+           key: optional key
+           attr_dict: optional attribute dict
+           attrs: more attributes
+           warning: udpates attr_dict with attrs"""
+        attr_dict = {} if attr_dict is None else attr_dict
+        attr_dict.update( attrs )
+        ids = self.ids
+        s = ids[ src ] if src in ids else self.nodeId( src )
+        d = ids[ dst ] if dst in ids else self.nodeId( dst )
+        pair = ( s, d ) if s < d else ( d, s )
+        edges = self.pairs.setdefault( pair, [] )
+        # If no key, pick next ordinal number
+        lastKey = self.lastKey.get( pair, 0 )
+        new = key is None
+        if new:
+            key = lastKey + 1
+        if isinstance( key, int ) and key > lastKey:
+            self.lastKey[ pair ] = key
+        # Split out endpoints and ports so that the rest can be shared
+        port1, port2 = attr_dict.get( 'port1' ), attr_dict.get( 'port2' )
+        if self.canSplit( src, dst, attr_dict ):
+            attr_dict = dict( attr_dict )
+            for k in self.endpoints:
+                del attr_dict[ k ]
+            attr_dict = self.share( attr_dict )
+        else:
+            port1 = port2 = -1
+        # Replace an existing edge with the same key
+        existing = () if new else edges
+        for e in existing:
+            if self.edgeKeys[ e ] == key:
+                self.src[ e ], self.dst[ e ] = s, d
+                self.port1[ e ], self.port2[ e ] = port1, port2
+                self.edgeAttrs[ e ] = attr_dict
+                return key
+        e = len( self.edgeKeys )
+        self.src.append( s )
+        self.dst.append( d )
+        self.port1.append( port1 )
+        self.port2.append( port2 )
+        self.edgeKeys.append( key )
+        self.edgeAttrs.append( attr_dict )
+        edges.append( e )
+        self.adj[ s ].append( e )
+        if d != s:
+            self.adj[ d ].append( e )
+        return key
+
+    def add_edges( self, edges, attr_dict=None ):
+        """Add many new edges with endpoints and ports (as added by Topo),
+           appending them directly to our arrays
+           edges: iterable of ( src, dst, port1, port2 ), with
+             non-negative integer ports
+           attr_dict: other attributes for every edge (optional)"""
+        attrs = self.share( dict( attr_dict ) if attr_dict else {} )
+        ids, pairs, lastKey, adj = self.ids, self.pairs, self.lastKey, self.adj
+        edgeKeys, edgeAttrs = self.edgeKeys, self.edgeAttrs
+        e = len( edgeKeys )
+        for src, dst, port1, port2 in edges:
+            s = ids[ src ] if src in ids else self.nodeId( src )
+            d = ids[ dst ] if dst in ids else self.nodeId( dst )
+            pair = ( s, d ) if s < d else ( d, s )
+            key = lastKey[ pair ] = lastKey.get( pair, 0 ) + 1
+            self.src.append( s )
+            self.dst.append( d )
+            self.port1.append( port1 )
+            self.port2.append( port2 )
+            edgeKeys.append( key )
+            edgeAttrs.append( attrs )
+            pairs.setdefault( pair, [] ).append( e )
+            adj[ s ].append( e )
+            if d != s:
+                adj[ d ].append( e )
+            e += 1
+
+    def edgeInfo( self, e ):
+        "Return attribute dict for edge id e"
+        attrs = self.edgeAttrs[ e ]
+        if self.port1[ e ] < 0:
+            return attrs
+        attrs = dict( attrs )
+        attrs.update( node1=self.names[ self.src[ e ] ],
+                      node2=self.names[ self.dst[ e ] ],
+                      port1=self.port1[ e ], port2=self.port2[ e ] )
+        return attrs
+
+    def nodes( self, data=False ):
+        """Return list of graph nodes
+           data: return list of ( node, attrs)"""
+        return self.node.items() if data else list( self.names )
+
+    def edges_iter( self, data=False, keys=False ):
+        "Iterator: return graph edges, in the order they were added"
+        names = self.names
+        for e, key in enumerate( self.edgeKeys ):
+            src, dst = names[ self.src[ e ] ], names[ self.dst[ e ] ]
+            if data:
+                if keys:
+                    yield( src, dst, key, self.edgeInfo( e ) )
+                else:
+                    yield( src, dst, self.edgeInfo( e ) )
+            else:
+                if keys:
+                    yield( src, dst, key )
+                else:
+                    yield( src, dst )
+
+    def edges( self, data=False, keys=False ):
+        "Return list of graph edges"
+        return list( self.edges_iter( data=data, keys=keys ) )
+
+    def __getitem__( self, node ):
+        "Return link dict for given src node (built on the fly)"
+        i = self.ids[ node ]
+        result = {}
+        for e in self.adj[ i ]:
+            other = self.dst[ e ] if self.src[ e ] == i else self.src[ e ]
+            result.setdefault( self.names[ other ], {} )[
+                self.edgeKeys[ e ] ] = self.edgeInfo( e )
+        return result
+
+    def __len__( self ):
+        "Return the number of nodes"
+        return len( self.names )
+
+    def sortKey( self, node ):
+        "Return natural sort key for node, computed once"
+        i = self.ids[ node ]
+        key = self.keys[ i ]
+        if key is None:
+            key = self.keys[ i ] = natural( node )
+        return key
+
+
 class Topo( object ):
     "Data center network representation for structured multi-trees."
 
+    # Graph class: MultiGraph, or CompactGraph for huge topologies
+    graph = MultiGraph
+
     def __init__( self, *args, **params ):
         """Topo object.
            Optional named parameters:
            hinfo: default host options
            sopts: default switch options
            lopts: default link options
+           graph: graph class (default: MultiGraph)
            calls build()"""
-        self.g = MultiGraph()
-        self.hopts = params.pop( 'hopts', {} )
-        self.sopts = params.pop( 'sopts', {} )
-        self.lopts = params.pop( 'lopts', {} )
-        # ports[src][dst][sport] is port on dst that connects to src
-        self.ports = {}
+        self.setup( graph=params.pop( 'graph', None ),
+                    hopts=params.pop( 'hopts', {} ),
+                    sopts=params.pop( 'sopts', {} ),
+                    lopts=params.pop( 'lopts', {} ) )
         self.build( *args, **params )
 
+    def setup( self, graph=None, hopts=None, sopts=None, lopts=None ):
+        """Initialize empty topology; called by __init__() and load()
+           graph: graph class (default: self.graph)
+           hopts, sopts, lopts: default host, switch and link options"""
+        self.g = ( graph or self.graph )()
+        self.hopts = {} if hopts is None else hopts
+        self.sopts = {} if sopts is None else sopts
+        self.lopts = {} if lopts is None else lopts
+        # ports[src][sport] is ( dst, dport ) for the port on dst
+        # that connects to src
+        self.ports = {}
+        # pairPorts[ ( src, dst ) ] is [ ( sport, dport ), ... ]
+        self.pairPorts = {}
+        # Cached nodes(), hosts() and switches(), by ( kind, sort )
+        self.nodeLists = {}
+
     def build( self, *args, **params ):
         "Override this method to build your topology."
         pass
@@ -124,6 +426,7 @@ def addNode( self, name, **opts ):
            opts: node options
            returns: node name"""
         self.g.add_node( name, **opts )
+        self.nodeLists.clear()
         return name
 
     def addHost( self, name, **opts ):
@@ -159,12 +462,51 @@ def addLink( self, node1, node2, port1=None, port2=None,
         self.g.add_edge(node1, node2, key, opts )
         return key
 
+    def addLinks( self, links, **opts ):
+        """Add many links at once, with precomputed ports; this is
+           much faster than addLink() for large topologies.
+           links: iterable of ( node1, node2, port1, port2 )
+           opts: link options for every link (optional)"""
+        if not opts and self.lopts:
+            opts = self.lopts
+        links = list( links )
+        ports, pairPorts = self.ports, self.pairPorts
+        for node1, node2, port1, port2 in links:
+            ports1 = ports.setdefault( node1, {} )
+            ports2 = ports.setdefault( node2, {} )
+            if node1 == node2 or port1 in ports1 or port2 in ports2:
+                # Let addPort() replace existing links on these ports
+                self.addPort( node1, node2, port1, port2 )
+                continue
+            ports1[ port1 ] = ( node2, port2 )
+            ports2[ port2 ] = ( node1, port1 )
+            pairPorts.setdefault( ( node1, node2 ), [] ).append(
+                ( port1, port2 ) )
+            pairPorts.setdefault( ( node2, node1 ), [] ).append(
+                ( port2, port1 ) )
+        self.g.add_edges( links, opts )
+
     def nodes( self, sort=True ):
         "Return nodes in graph"
-        if sort:
-            return self.sorted( self.g.nodes() )
-        else:
-            return self.g.nodes()
+        return list( self.nodeList( 'nodes', sort ) )
+
+    def nodeList( self, kind, sort ):
+        """Internal method: return cached list of nodes, hosts or
+           switches, which is rebuilt only after nodes change
+           kind: 'nodes', 'hosts' or 'switches'
+           sort: sort nodes alphabetically"""
+        nodes = self.nodeLists.get( ( kind, sort ) )
+        if nodes is None:
+            if kind == 'nodes':
+                nodes = self.g.nodes()
+                if sort:
+                    nodes = sorted( nodes, key=self.g.sortKey )
+            else:
+                isSwitch = kind == 'switches'
+                nodes = [ n for n in self.nodeList( 'nodes', sort )
+                          if self.isSwitch( n ) == isSwitch ]
+            self.nodeLists[ ( kind, sort ) ] = nodes
+        return nodes
 
     def isSwitch( self, n ):
         "Returns true if node is a switch."
@@ -174,13 +516,13 @@ def switches( self, sort=True ):
         """Return switches.
            sort: sort switches alphabetically
            returns: dpids list of dpids"""
-        return [ n for n in self.nodes( sort ) if self.isSwitch( n ) ]
+        return list( self.nodeList( 'switches', sort ) )
 
     def hosts( self, sort=True ):
         """Return hosts.
            sort: sort hosts alphabetically
            returns: list of hosts"""
-        return [ n for n in self.nodes( sort ) if not self.isSwitch( n ) ]
+        return list( self.nodeList( 'hosts', sort ) )
 
     def iterLinks( self, withKeys=False, withInfo=False ):
         """Return links (iterator)
@@ -210,8 +552,14 @@ def links( self, sort=False, withKeys=False, withInfo=False ):
         if not sort:
             return links
         # Ignore info when sorting
-        tupleSize = 3 if withKeys else 2
-        return sorted( links, key=( lambda l: naturalSeq( l[ :tupleSize ] ) ) )
+        sortKey = self.g.sortKey
+
+        def linkKey( link ):
+            "Sort by endpoints, then by key if we have one"
+            ends = ( sortKey( link[ 0 ] ), sortKey( link[ 1 ] ) )
+            return ( ends + ( natural( link[ 2 ] ), ) ) if withKeys else ends
+
+        return sorted( links, key=linkKey )
 
     # This legacy port management mechanism is clunky and will probably
     # be removed at some point.
@@ -231,8 +579,16 @@ def addPort( self, src, dst, sport=None, dport=None ):
         if dport is None:
             dst_base = 1 if self.isSwitch( dst ) else 0
             dport = len( ports[ dst ] ) + dst_base
-        ports[ src ][ sport ] = ( dst, dport )
-        ports[ dst ][ dport ] = ( src, sport )
+        # Keep pairPorts[ ( node, other ) ] in step with ports[ node ]
+        pairPorts = self.pairPorts
+        for node, port, other, oport in ( ( src, sport, dst, dport ),
+                                          ( dst, dport, src, sport ) ):
+            old = ports[ node ].get( port )
+            if old is not None:
+                pairPorts[ ( node, old[ 0 ] ) ].remove( ( port, old[ 1 ] ) )
+            ports[ node ][ port ] = ( other, oport )
+            pairPorts.setdefault( ( node, other ), [] ).append(
+                ( port, oport ) )
         return sport, dport
 
     def port( self, src, dst ):
@@ -244,10 +600,7 @@ def port( self, src, dst ):
                 sport = port on source switch leading to the destination switch
                 dport = port on destination switch leading to the source switch
             Note that you can also look up ports using linkInfo()"""
-        # A bit ugly and slow vs. single-link implementation ;-(
-        ports = [ ( sport, entry[ 1 ] )
-                  for sport, entry in self.ports[ src ].items()
-                  if entry[ 0 ] == dst ]
+        ports = sorted( self.pairPorts.get( ( src, dst ), [] ) )
         return ports if len( ports ) != 1 else ports[ 0 ]
 
     def _linkEntry( self, src, dst, key=None ):
@@ -264,8 +617,8 @@ def linkInfo( self, src, dst, key=None ):
 
     def setlinkInfo( self, src, dst, info, key=None ):
         "Set link metadata dict"
-        entry, key = self._linkEntry( src, dst, key )
-        entry[ key ] = info
+        _entry, key = self._linkEntry( src, dst, key )
+        self.g.add_edge( src, dst, key, info )
 
     def nodeInfo( self, name ):
         "Return metadata (dict) for node"
@@ -274,6 +627,7 @@ def nodeInfo( self, name ):
     def setNodeInfo( self, name, info ):
         "Set metadata (dict) for node"
         self.g.node[ name ] = info
+        self.nodeLists.clear()
 
     def convertTo( self, cls, data=True, keys=True ):
         """Convert to a new object of networkx.MultiGraph-like class cls
@@ -286,6 +640,171 @@ def sorted( items ):
         "Items sorted in natural (i.e. alphabetical) order"
         return sorted( items, key=natural )
 
+    # Snapshot format: version, graph classes and link columns
+    snapshotVersion = 1
+    graphs = { 'MultiGraph': MultiGraph, 'CompactGraph': CompactGraph }
+    linkColumns = ( 'node1', 'node2', 'port1', 'port2', 'key', 'opts' )
+
+    def save( self, path ):
+        """Save nodes, links, ports and options (but not other
+           attributes) as columnar JSON, gzipped if path ends in .gz;
+           options must round-trip exactly through JSON, so no tuples
+           or non-string dict keys (TypeError otherwise)
+           path: file name"""
+        opts, optIds = [], {}
+
+        def optId( info ):
+            "Return index of info in opts, adding it if necessary"
+            try:
+                key = frozenset( info.iteritems() )
+            except TypeError:
+                # Unhashable values
+                key = json.dumps( info, sort_keys=True )
+            i = optIds.get( key )
+            if i is None:
+                i = optIds[ key ] = len( opts )
+                opts.append( info )
+            return i
+
+        nodes = self.g.nodes()
+        ids = dict( ( node, i ) for i, node in enumerate( nodes ) )
+        links = dict( ( col, [] ) for col in self.linkColumns )
+        columns = [ links[ col ] for col in self.linkColumns ]
+        for src, dst, key, info in self.g.edges_iter( data=True, keys=True ):
+            info = dict( info )
+            row = ( ids[ info.pop( 'node1', src ) ],
+                    ids[ info.pop( 'node2', dst ) ],
+                    info.pop( 'port1', None ), info.pop( 'port2', None ),
+                    key, optId( info ) )
+            for column, value in zip( columns, row ):
+                column.append( value )
+        graphName = type( self.g ).__name__
+        data = { 'version': self.snapshotVersion,
+                 'graph': graphName if graphName in self.graphs else None,
+                 'hopts': self.hopts, 'sopts': self.sopts,
+                 'lopts': self.lopts,
+                 'nodes': nodes,
+                 'nodeOpts': [ optId( self.g.node[ n ] ) for n in nodes ],
+                 'links': links, 'opts': opts }
+        text = json.dumps( data, sort_keys=True, separators=( ',', ':' ) )
+        # JSON turns tuples into lists and dict keys into strings,
+        # which load() would silently pass on to nodes and links
+        if _encode( json.loads( text ) ) != data:
+            raise TypeError( 'Topology options do not round-trip '
+                             'through JSON (e.g. tuples or non-string '
+                             'dict keys)' )
+        opener = gzip.open if path.endswith( '.gz' ) else open
+        with opener( path, 'wb' ) as f:
+            f.write( text )
+
+    @classmethod
+    def load( cls, path, **params ):
+        """Load topology saved by save(), without calling build()
+           path: file name
+           params: setup() parameters (default: as saved)
+           returns: topology of this class"""
+        opener = gzip.open if path.endswith( '.gz' ) else open
+        with opener( path, 'rb' ) as f:
+            data = json.load( f )
+        if data.get( 'version' ) != cls.snapshotVersion:
+            raise ValueError( 'Unsupported topology snapshot version %s' %
+                              data.get( 'version' ) )
+        topo = cls.__new__( cls )
+        topo.setup( graph=params.get( 'graph',
+                                      cls.graphs.get( data[ 'graph' ] ) ) )
+        nodes, opts = _encode( data[ 'nodes' ] ), _encode( data[ 'opts' ] )
+        for node, i in zip( nodes, data[ 'nodeOpts' ] ):
+            topo.addNode( node, **opts[ i ] )
+        # Add runs of links with generated keys and the same options
+        # in bulk, and any others one at a time
+        lastKeys, batch, batchOpts = {}, [], None
+        links = data[ 'links' ]
+        links[ 'key' ] = _encode( links[ 'key' ] )
+        for n1, n2, port1, port2, key, i in zip(
+                *[ links[ col ] for col in cls.linkColumns ] ):
+            pair = ( n1, n2 ) if n1 <= n2 else ( n2, n1 )
+            lastKey = lastKeys.get( pair, 0 )
+            if isinstance( key, int ) and key > lastKey:
+                lastKeys[ pair ] = key
+            bulk = ( key == lastKey + 1 and
+                     port1 is not None and port2 is not None )
+            if batch and ( not bulk or i != batchOpts ):
+                topo.addLinks( batch, **opts[ batchOpts ] )
+                batch = []
+            if bulk:
+                batch.append( ( nodes[ n1 ], nodes[ n2 ], port1, port2 ) )
+                batchOpts = i
+            else:
+                topo.addLink( nodes[ n1 ], nodes[ n2 ], port1, port2, key,
+                              **opts[ i ] )
+        if batch:
+            topo.addLinks( batch, **opts[ batchOpts ] )
+        # Set default options last, so that they don't override
+        # the saved ones
+        for name in 'hopts', 'sopts', 'lopts':
+            setattr( topo, name, params.get( name, _encode( data[ name ] ) ) )
+        return topo
+
+
+def _encode( obj ):
+    "Return obj (from JSON) with unicode strings converted to str"
+    if isinstance( obj, unicode ):
+        return obj.encode( 'utf-8' )
+    if isinstance( obj, list ):
+        return [ _encode( item ) for item in obj ]
+    if isinstance( obj, dict ):
+        return dict( ( _encode( k ), _encode( v ) )
+                     for k, v in obj.iteritems() )
+    return obj
+
+
+def cachedTopo( cache, topoClass, *args, **params ):
+    """Return topoClass( *args, **params ), loading it from cache if
+       possible, or building it and saving it to cache otherwise.
+       Snapshots are keyed by topology class, build() parameters, and
+       the modification time of the class's source file; topologies
+       which can't be saved (see Topo.save()) are simply built, as
+       are topologies from constructors which aren't Topo subclasses.
+       Attributes which build() sets (e.g. self.k) aren't restored
+       from snapshots.
+       cache: cache directory
+       topoClass: Topo subclass (or other topology constructor)
+       returns: topology"""
+    if not ( isinstance( topoClass, type ) and
+             issubclass( topoClass, Topo ) ):
+        return topoClass( *args, **params )
+    try:
+        mtime = os.path.getmtime( inspect.getsourcefile( topoClass ) )
+    except ( TypeError, OSError ):
+        # No source file
+        return topoClass( *args, **params )
+    key = repr( ( topoClass.__module__, topoClass.__name__, mtime,
+                  Topo.snapshotVersion, args, sorted( params.items() ) ) )
+    name = '%s-%s.json.gz' % ( topoClass.__name__,
+                               hashlib.sha1( key ).hexdigest()[ :16 ] )
+    path = os.path.join( cache, name )
+    if os.path.exists( path ):
+        try:
+            return topoClass.load( path )
+        except ( IOError, ValueError, KeyError ) as e:
+            warn( '*** Ignoring bad topology snapshot %s: %s\n' %
+                  ( path, e ) )
+    topo = topoClass( *args, **params )
+    # Save atomically, so that concurrent runs see whole snapshots
+    tmp = os.path.join( cache, '.%d-%s' % ( os.getpid(), name ) )
+    try:
+        if not os.path.isdir( cache ):
+            os.makedirs( cache )
+        topo.save( tmp )
+        os.rename( tmp, path )
+    except ( TypeError, ValueError ) as e:
+        debug( '*** Not caching topology %s: %s\n' % ( name, e ) )
+    except ( IOError, OSError ) as e:
+        warn( '*** Could not cache topology in %s: %s\n' % ( cache, e ) )
+    if os.path.exists( tmp ):
+        os.unlink( tmp )
+    return topo
+
 
 # Our idiom defines additional parameters in build(param...)
 # pylint: disable=arguments-differ
@@ -1,6 +1,9 @@
 "Library of potentially useful topologies for Mininet"
 
-from mininet.topo import Topo
+from itertools import combinations
+from random import Random
+
+from mininet.topo import Topo, CompactGraph
 from mininet.net import Mininet
 
 # The build() method is expected to do this:
@@ -79,4 +82,207 @@ def build( self, x, y, n=1 ):
                 self.addLink( sw1, sw2 )
                 self.addLink( sw1, sw3 )
 
+
+class FabricTopo( Topo ):
+    """Base class for large generated fabrics, which use CompactGraph
+       and add their links in bulk, with precomputed ports.
+       Numbering: h1..N, s1..M, with switch ports starting at 1;
+       subclasses call addFabric() with their switch-to-switch links."""
+
+    graph = CompactGraph
+
+    def addFabric( self, switches, hosts, links ):
+        """Add switches, hosts and links
+           switches: number of switches
+           hosts: list of switch indexes for each host; each switch's
+             hosts use its ports 1..n, in order
+           links: list of ( switch1, port1, switch2, port2 ) for
+             switch indexes from 0 (ports should follow the hosts)
+           returns: list of switch names"""
+        names = [ self.addSwitch( 's%d' % ( i + 1 ) )
+                  for i in range( switches ) ]
+        hostPorts = [ 0 ] * switches
+        hostLinks = []
+        for i, sw in enumerate( hosts ):
+            hostPorts[ sw ] += 1
+            hostLinks.append( ( self.addHost( 'h%d' % ( i + 1 ) ),
+                                names[ sw ], 0, hostPorts[ sw ] ) )
+        self.addLinks( hostLinks )
+        self.addLinks( ( names[ sw1 ], names[ sw2 ], port1, port2 )
+                       for sw1, port1, sw2, port2 in links )
+        return names
+
+
+class FatTreeTopo( FabricTopo ):
+    """k-ary fat tree: k pods, each with k/2 edge and k/2 aggregation
+       switches, and (k/2)^2 core switches. Switches are numbered
+       core first, then aggregation and edge switches pod by pod.
+       WARNING: this topology has LOOPS (see TorusTopo)"""
+
+    def build( self, k=4, n=None ):
+        """k: switch radix (even)
+           n: hosts per edge switch (default k/2)"""
+        if k < 2 or k % 2:
+            raise Exception( 'Fat tree radix must be even' )
+        half = k // 2
+        n = half if n is None else n
+        core = half * half
+
+        def agg( pod, a ):
+            "Index of aggregation switch a in pod"
+            return core + pod * k + a
+
+        def edge( pod, e ):
+            "Index of edge switch e in pod"
+            return core + pod * k + half + e
+
+        links = []
+        for pod in range( k ):
+            for a in range( half ):
+                # Aggregation switch a connects to core switches a*k/2..
+                for c in range( half ):
+                    links.append( ( agg( pod, a ), half + c + 1,
+                                    a * half + c, pod + 1 ) )
+                # Edge switch e uses ports n+1.. for aggregation
+                for e in range( half ):
+                    links.append( ( edge( pod, e ), n + a + 1,
+                                    agg( pod, a ), e + 1 ) )
+        hosts = [ edge( pod, e ) for pod in range( k ) for e in range( half )
+                  for _ in range( n ) ]
+        self.addFabric( core + k * k, hosts, links )
+
+
+class ClosTopo( FabricTopo ):
+    """Two-tier leaf-spine (folded Clos) fabric: every leaf
+       switch connects to every spine switch. Switches are
+       numbered spines first, then leaves.
+       WARNING: this topology has LOOPS (see TorusTopo)"""
+
+    def build( self, spines=2, leaves=4, n=1, links=1 ):
+        """spines: number of spine switches
+           leaves: number of leaf switches
+           n: hosts per leaf switch
+           links: parallel links between each leaf and spine"""
+        fabric = [ ( spines + l, n + s * links + i + 1,
+                     s, l * links + i + 1 )
+                   for l in range( leaves ) for s in range( spines )
+                   for i in range( links ) ]
+        hosts = [ spines + l for l in range( leaves ) for _ in range( n ) ]
+        self.addFabric( spines + leaves, hosts, fabric )
+
+
+class DragonflyTopo( FabricTopo ):
+    """Dragonfly: groups of a fully connected routers, each with p
+       hosts and h global links; groups connect to each other with
+       at most one global link per pair (so g <= a * h + 1 groups.)
+       WARNING: this topology has LOOPS (see TorusTopo)"""
+
+    def build( self, a=4, p=2, h=2, g=None ):
+        """a: routers (switches) per group
+           p: hosts per router
+           h: global links per router
+           g: number of groups (default a * h + 1)"""
+        g = a * h + 1 if g is None else g
+        if g > a * h + 1:
+            raise Exception( 'Dragonfly has at most a * h + 1 groups' )
+
+        def router( group, r ):
+            "Index of router r in group"
+            return group * a + r
+
+        links = []
+        for group in range( g ):
+            # Local ports p+1..p+a-1
+            for r1, r2 in combinations( range( a ), 2 ):
+                links.append( ( router( group, r1 ), p + r2,
+                                router( group, r2 ), p + r1 + 1 ) )
+        # Global ports p+a..p+a+h-1: group i's channel c goes to
+        # group c (or c+1 if c >= i), on router c // h
+        for i, j in combinations( range( g ), 2 ):
+            ci, cj = j - 1, i
+            links.append( ( router( i, ci // h ), p + a + ci % h,
+                            router( j, cj // h ), p + a + cj % h ) )
+        hosts = [ sw for sw in range( g * a ) for _ in range( p ) ]
+        self.addFabric( g * a, hosts, links )
+
+
+class JellyfishTopo( FabricTopo ):
+    """Jellyfish: a random regular graph of switches, built by
+       linking random pairs of switches with free ports, and then
+       splicing switches with free ports into existing links.
+       The seed makes the topology repeatable.
+       WARNING: this topology has LOOPS (see TorusTopo)"""
+
+    def build( self, switches=16, degree=3, n=1, seed=0 ):
+        """switches: number of switches
+           degree: switch-to-switch links per switch
+           n: hosts per switch
+           seed: random seed"""
+        if degree >= switches:
+            raise Exception( 'Jellyfish degree must be less than the '
+                             'number of switches' )
+        rng = Random( seed )
+        neighbors = [ set() for _ in range( switches ) ]
+        pairs = []
+        # Switches with free ports, and their positions in that list
+        free = list( range( switches ) )
+        where = list( range( switches ) )
+
+        def link( sw1, sw2 ):
+            "Link two switches, and drop them from free if full"
+            neighbors[ sw1 ].add( sw2 )
+            neighbors[ sw2 ].add( sw1 )
+            pairs.append( ( sw1, sw2 ) )
+            for sw in sw1, sw2:
+                if len( neighbors[ sw ] ) == degree:
+                    last = free.pop()
+                    if last != sw:
+                        free[ where[ sw ] ] = last
+                        where[ last ] = where[ sw ]
+
+        def pick():
+            "Return random unlinked pair of switches with free ports"
+            for _ in range( 10 ):
+                sw1, sw2 = rng.sample( free, 2 )
+                if sw2 not in neighbors[ sw1 ]:
+                    return sw1, sw2
+            # Few free switches left, so check every pair
+            unlinked = [ ( end1, end2 )
+                         for end1, end2 in combinations( free, 2 )
+                         if end2 not in neighbors[ end1 ] ]
+            return rng.choice( unlinked ) if unlinked else None
+
+        while len( free ) > 1:
+            pair = pick()
+            if pair is None:
+                break
+            link( *pair )
+        # Splice switches with two or more free ports into links
+        for sw in list( free ):
+            while degree - len( neighbors[ sw ] ) > 1:
+                candidates = [ i for i, ( end1, end2 ) in enumerate( pairs )
+                               if sw not in ( end1, end2 ) and
+                               end1 not in neighbors[ sw ] and
+                               end2 not in neighbors[ sw ] ]
+                if not candidates:
+                    break
+                i = rng.choice( candidates )
+                sw1, sw2 = pairs[ i ]
+                pairs[ i ] = pairs[ -1 ]
+                pairs.pop()
+                for other, old in ( sw1, sw2 ), ( sw2, sw1 ):
+                    neighbors[ other ].remove( old )
+                    neighbors[ other ].add( sw )
+                    neighbors[ sw ].add( other )
+                    pairs.append( ( sw, other ) )
+        # Assign ports in link order, after each switch's hosts
+        nextPort = [ n + 1 ] * switches
+        links = []
+        for sw1, sw2 in pairs:
+            links.append( ( sw1, nextPort[ sw1 ], sw2, nextPort[ sw2 ] ) )
+            nextPort[ sw1 ] += 1
+            nextPort[ sw2 ] += 1
+        hosts = [ sw for sw in range( switches ) for _ in range( n ) ]
+        self.addFabric( switches, hosts, links )
+
 # pylint: enable=arguments-differ
@@ -53,6 +53,11 @@ def oldQuietRun( *cmd ):
     return out
 
 
+# Interface state which Linux nodes cache for each network namespace
+# (see Node.intfState()); commands which we run may change any of it,
+# as may the interface helpers in linux/util.py, so they clear it
+intfCaches = {}
+
 # This is a bit complicated, but it enables us to
 # monitor command output as it is happening
 
@@ -79,6 +84,7 @@ def errRun( *cmd, **kwargs ):
     elif isinstance( cmd, list ) and shell:
         cmd = " ".join( arg for arg in cmd )
     debug( '*** errRun:', cmd, '\n' )
+    intfCaches.clear()
     popen = Popen( cmd, stdout=PIPE, stderr=stderr, shell=shell )
     # We use poll() because select() doesn't work with large fd numbers,
     # and thus communicate() doesn't work either
@@ -419,13 +425,18 @@ def __init__( self, *args, **params ):
     return CustomClass
 
 
-def buildTopo( topos, topoStr ):
+def buildTopo( topos, topoStr, cache=None ):
     """Create topology from string with format (object, arg1, arg2,...).
     input topos is a dict of topo names to constructors, possibly w/args.
+    cache: optional topology cache directory (see mininet.topo.cachedTopo)
     """
     topo, args, kwargs = splitArgs( topoStr )
     if topo not in topos:
         raise Exception( 'Invalid topo name %s' % topo )
+    if cache:
+        # mininet.topo imports this module
+        from mininet.topo import cachedTopo
+        return cachedTopo( cache, topos[ topo ], *args, **kwargs )
     return topos[ topo ]( *args, **kwargs )
 
 def ensureRoot():